@@ -1,13 +1,22 @@
 from pathlib import Path
 import sqlite3
-from typing import Iterable, Optional, Tuple, Dict, Any
-from datetime import datetime, timezone
-import json
+import threading
+import atexit
+from contextlib import contextmanager
+from typing import Iterable, Optional, NamedTuple
 
 DB_PATH = Path.home() / ".scriptdeck" / "scriptdeck.db"
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 DDL = """
+CREATE TABLE IF NOT EXISTS folders (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  parent_id INTEGER NULL REFERENCES folders(id) ON DELETE CASCADE,
+  position INTEGER NOT NULL DEFAULT 0,
+  UNIQUE(parent_id, name)
+);
+
 CREATE TABLE IF NOT EXISTS scripts (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   name TEXT NOT NULL,
@@ -15,7 +24,12 @@ CREATE TABLE IF NOT EXISTS scripts (
   tags TEXT DEFAULT '',
   description TEXT DEFAULT '',
   last_run TEXT DEFAULT NULL,
-  run_count INTEGER DEFAULT 0
+  run_count INTEGER DEFAULT 0,
+  args_schema TEXT DEFAULT NULL,
+  args_values TEXT DEFAULT NULL,
+  venv_id INTEGER DEFAULT NULL,
+  working_dir TEXT DEFAULT NULL,
+  folder_id INTEGER DEFAULT NULL REFERENCES folders(id) ON DELETE SET NULL
 );
 
 CREATE TABLE IF NOT EXISTS venvs (
@@ -24,7 +38,7 @@ CREATE TABLE IF NOT EXISTS venvs (
   path TEXT NOT NULL UNIQUE,
   python_path TEXT NOT NULL,
   created_at TEXT DEFAULT NULL,
-  last_used_at TEXT DEFAULT NULL
+  last_used_at_ms INTEGER DEFAULT NULL
 );
 
 CREATE TABLE IF NOT EXISTS option_history (
@@ -32,7 +46,7 @@ CREATE TABLE IF NOT EXISTS option_history (
   script_id INTEGER NOT NULL,
   option TEXT NOT NULL,
   value TEXT NOT NULL,
-  last_used_at TEXT DEFAULT NULL,
+  last_used_at_ms INTEGER DEFAULT NULL,
   use_count INTEGER DEFAULT 1,
   UNIQUE(script_id, option, value)
 );
@@ -46,68 +60,266 @@ CREATE TABLE IF NOT EXISTS ai_history (
 );
 """
 
+# UTC ISO-8601 timestamp generated by SQLite itself
+_SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%fZ','now')"
+# Same instant as integer unix milliseconds (compact, cheap to compare/index)
+_SQL_NOW_MS = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+# Hot-path statements kept as module constants so sqlite3's statement cache reuses them
+_SQL_BUMP_RUN = "UPDATE scripts SET last_run=?, run_count=COALESCE(run_count,0)+1 WHERE id=?"
+_SQL_ASSIGN_FOLDER = "UPDATE scripts SET folder_id=? WHERE id=?"
+# Upsert that also places the script; a NULL folder_id keeps an existing assignment
+_SQL_UPSERT_SCRIPT_IN_FOLDER = """
+INSERT INTO scripts(name, path, tags, description, folder_id)
+VALUES(?,?,?,?,?)
+ON CONFLICT(path) DO UPDATE SET
+  name=excluded.name,
+  tags=excluded.tags,
+  description=excluded.description,
+  folder_id=COALESCE(excluded.folder_id, scripts.folder_id)
+"""
+_SQL_SET_ARGS_SCHEMA = "UPDATE scripts SET args_schema=? WHERE id=?"
+_SQL_SET_ARGS_VALUES = "UPDATE scripts SET args_values=? WHERE id=?"
+_SQL_SET_VENV = "UPDATE scripts SET venv_id=? WHERE id=?"
+_SQL_SET_WORKING_DIR = "UPDATE scripts SET working_dir=? WHERE id=?"
+# executemany takes the statement without RETURNING
+_SQL_OPTHIST_UPSERT_MANY = f"""
+INSERT INTO option_history(script_id, option, value, last_used_at_ms, use_count)
+VALUES(?,?,?,{_SQL_NOW_MS},1)
+ON CONFLICT(script_id, option, value) DO UPDATE SET
+  last_used_at_ms=excluded.last_used_at_ms,
+  use_count=option_history.use_count+1
+"""
+_SQL_OPTHIST_UPSERT = _SQL_OPTHIST_UPSERT_MANY + "RETURNING use_count\n"
+_SQL_OPTHIST_COUNT = "SELECT COUNT(*) FROM option_history WHERE script_id=? AND option=?"
+# Delete only the oldest surplus rows (LIMIT = count - keep)
+_SQL_OPTHIST_PRUNE = """
+DELETE FROM option_history WHERE id IN (
+  SELECT id FROM option_history
+  WHERE script_id=? AND option=?
+  ORDER BY last_used_at_ms ASC, use_count ASC, id ASC
+  LIMIT ?
+)
+"""
+_SQL_AIHIST_INSERT = f"INSERT INTO ai_history(script_id, question, answer, created_at) VALUES(?,?,?,{_SQL_NOW})"
+_SQL_AIHIST_COUNT = "SELECT COUNT(*) FROM ai_history WHERE script_id=?"
+_SQL_AIHIST_PRUNE = """
+DELETE FROM ai_history WHERE id IN (
+  SELECT id FROM ai_history WHERE script_id=? ORDER BY created_at ASC, id ASC LIMIT ?
+)
+"""
+
+# Per-connection settings; synchronous=NORMAL is durable enough under WAL
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA foreign_keys=ON;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-16000;",
+    "PRAGMA mmap_size=268435456;",
+    "PRAGMA wal_autocheckpoint=1000;",
+    "PRAGMA busy_timeout=5000;",
+)
+
+# One writer and one reader connection per thread, opened lazily and reused.
+# `with _writer() as conn:` only commits/rolls back; it never closes.
+_tls = threading.local()
+_open_conns: list[sqlite3.Connection] = []
+_open_conns_lock = threading.Lock()
+# Schema creation/migration runs once per process, not once per connection
+_SCHEMA_READY = False
+# Bumped after every commit that changed rows; lets callers tell whether cached reads are still current
+_commit_gen = 0
+
+def _connect() -> sqlite3.Connection:
+    # check_same_thread=False only so the exit hook can close every thread's handle
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+    # Rows support index, unpacking and name access without per-row dicts
+    conn.row_factory = sqlite3.Row
+    # page_size only sticks on an empty database and before WAL is enabled
+    if not _SCHEMA_READY and conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is None:
+        conn.execute("PRAGMA page_size=8192;")
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    with _open_conns_lock:
+        _open_conns.append(conn)
+    return conn
+
+def _init_schema(conn: sqlite3.Connection):
+    global _SCHEMA_READY
+    if not _SCHEMA_READY:
+        with _open_conns_lock:
+            if not _SCHEMA_READY:
+                conn.executescript(DDL)
+                _ensure_schema(conn)
+                _SCHEMA_READY = True
+
 def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA foreign_keys=ON;")
-    conn.executescript(DDL)
-    _ensure_schema(conn)
+    """Writer connection for the current thread."""
+    conn = getattr(_tls, "conn", None)
+    if conn is not None:
+        return conn
+    conn = _connect()
+    _init_schema(conn)
+    _tls.conn = conn
     return conn
 
-def _ensure_schema(conn: sqlite3.Connection):
-    # Add new columns to scripts table if missing
-    cols = {row[1] for row in conn.execute("PRAGMA table_info(scripts)").fetchall()}
-    if 'args_schema' not in cols:
-        try:
-            conn.execute("ALTER TABLE scripts ADD COLUMN args_schema TEXT DEFAULT NULL")
-        except Exception:
-            pass
-    if 'args_values' not in cols:
-        try:
-            conn.execute("ALTER TABLE scripts ADD COLUMN args_values TEXT DEFAULT NULL")
-        except Exception:
-            pass
-    if 'venv_id' not in cols:
-        try:
-            conn.execute("ALTER TABLE scripts ADD COLUMN venv_id INTEGER DEFAULT NULL")
-        except Exception:
-            pass
-    if 'working_dir' not in cols:
-        try:
-            conn.execute("ALTER TABLE scripts ADD COLUMN working_dir TEXT DEFAULT NULL")
-        except Exception:
-            pass
-    # Folders table and scripts.folder_id
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS folders (
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          name TEXT NOT NULL,
-          parent_id INTEGER NULL REFERENCES folders(id) ON DELETE CASCADE,
-          position INTEGER NOT NULL DEFAULT 0,
-          UNIQUE(parent_id, name)
-        );
-        """
-    )
-    # Add folder_id column for scripts if missing
-    cols = {row[1] for row in conn.execute("PRAGMA table_info(scripts)").fetchall()}
-    if 'folder_id' not in cols:
+@contextmanager
+def _writer():
+    """Yield the writer connection; commit on exit unless a batch() is open."""
+    conn = get_conn()
+    if getattr(_tls, "batch_depth", 0):
+        yield conn
+        return
+    changes = conn.total_changes
+    with conn:
+        yield conn
+    if conn.total_changes != changes:
+        _bump_commit_gen()
+
+@contextmanager
+def batch():
+    """Run several db calls in one BEGIN IMMEDIATE transaction (single commit).
+
+    Nested batches join the outermost one. Reads go through the reader
+    connection and only see the batched writes after it commits.
+    """
+    conn = get_conn()
+    depth = getattr(_tls, "batch_depth", 0)
+    if depth:
+        _tls.batch_depth = depth + 1
         try:
-            conn.execute("ALTER TABLE scripts ADD COLUMN folder_id INTEGER DEFAULT NULL REFERENCES folders(id) ON DELETE SET NULL")
-        except Exception:
-            pass
-    # Indexes
+            yield
+        finally:
+            _tls.batch_depth = depth
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    changes = conn.total_changes
+    _tls.batch_depth = 1
     try:
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_folders_parent ON folders(parent_id)")
-    except Exception:
-        pass
+        yield
+    except BaseException:
+        _tls.batch_depth = 0
+        conn.rollback()
+        raise
+    _tls.batch_depth = 0
+    conn.commit()
+    # Empty batches (e.g. a drop where nothing moved) leave cached reads valid
+    if conn.total_changes != changes:
+        _bump_commit_gen()
+
+def _bump_commit_gen():
+    # Writers on several threads commit; += alone could lose an increment
+    global _commit_gen
+    with _open_conns_lock:
+        _commit_gen += 1
+
+def commit_generation() -> int:
+    """Counter that changes whenever a write transaction commits (any thread)."""
+    return _commit_gen
+
+def _read_conn() -> sqlite3.Connection:
+    """Reader connection for the current thread; under WAL it never waits on writers."""
+    conn = getattr(_tls, "reader", None)
+    if conn is not None:
+        return conn
+    conn = _connect()
+    # Schema must exist before the first read; a read-only thread needs no writer for it
+    _init_schema(conn)
+    conn.execute("PRAGMA query_only=ON;")
+    _tls.reader = conn
+    return conn
+
+def _optimize(conn: sqlite3.Connection):
+    # Readers are query_only; lift it briefly so ANALYZE can store its results
     try:
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_scripts_folder ON scripts(folder_id)")
+        query_only = conn.execute("PRAGMA query_only;").fetchone()[0]
+        if query_only:
+            conn.execute("PRAGMA query_only=OFF;")
+        try:
+            conn.execute("PRAGMA optimize;")
+        finally:
+            if query_only:
+                conn.execute("PRAGMA query_only=ON;")
     except Exception:
         pass
 
+def maintenance():
+    """Let SQLite refresh planner statistics; cheap enough for an idle timer."""
+    for conn in (getattr(_tls, "conn", None), getattr(_tls, "reader", None)):
+        if conn is not None:
+            _optimize(conn)
+
+def close_all():
+    """Optimize and close every cached connection (registered to run at interpreter exit)."""
+    with _open_conns_lock:
+        conns = list(_open_conns)
+        _open_conns.clear()
+    for conn in conns:
+        _optimize(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+    _tls.conn = None
+    _tls.reader = None
+
+atexit.register(close_all)
+
+# Columns added after the first release: (table, column, ALTER, optional backfill).
+# Fresh installs already get them from DDL; only older databases run these.
+_MIGRATIONS = (
+    ("scripts", "args_schema", "ALTER TABLE scripts ADD COLUMN args_schema TEXT DEFAULT NULL", None),
+    ("scripts", "args_values", "ALTER TABLE scripts ADD COLUMN args_values TEXT DEFAULT NULL", None),
+    ("scripts", "venv_id", "ALTER TABLE scripts ADD COLUMN venv_id INTEGER DEFAULT NULL", None),
+    ("scripts", "working_dir", "ALTER TABLE scripts ADD COLUMN working_dir TEXT DEFAULT NULL", None),
+    ("scripts", "folder_id",
+     "ALTER TABLE scripts ADD COLUMN folder_id INTEGER DEFAULT NULL REFERENCES folders(id) ON DELETE SET NULL", None),
+    # last_used_at moved from ISO TEXT to INTEGER unix-ms
+    ("option_history", "last_used_at_ms", "ALTER TABLE option_history ADD COLUMN last_used_at_ms INTEGER DEFAULT NULL",
+     "UPDATE option_history SET last_used_at_ms = CAST((julianday(last_used_at) - 2440587.5) * 86400000 AS INTEGER) "
+     "WHERE last_used_at IS NOT NULL"),
+    ("venvs", "last_used_at_ms", "ALTER TABLE venvs ADD COLUMN last_used_at_ms INTEGER DEFAULT NULL",
+     "UPDATE venvs SET last_used_at_ms = CAST((julianday(last_used_at) - 2440587.5) * 86400000 AS INTEGER) "
+     "WHERE last_used_at IS NOT NULL"),
+)
+
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_folders_parent ON folders(parent_id)",
+    # (folder_id, name) serves the FK lookups and the per-folder/grouped script listings' ORDER BY
+    "CREATE INDEX IF NOT EXISTS idx_scripts_folder_name ON scripts(folder_id, name COLLATE NOCASE)",
+    # Covering indexes for history lookups/prunes (filter + ORDER BY keys)
+    "CREATE INDEX IF NOT EXISTS idx_opthist_recent "
+    "ON option_history(script_id, option, last_used_at_ms DESC, use_count DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_aihist_script_created ON ai_history(script_id, created_at DESC, id DESC)",
+    # Superseded indexes
+    "DROP INDEX IF EXISTS idx_scripts_folder",
+    "DROP INDEX IF EXISTS idx_opthist_lookup",
+)
+
+def _ensure_schema(conn: sqlite3.Connection):
+    # Exact column names per migrated table, from one pragma_table_info join
+    tables = sorted({m[0] for m in _MIGRATIONS})
+    existing = {
+        (table, column)
+        for table, column in conn.execute(
+            "SELECT m.name, p.name FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p "
+            f"WHERE m.type='table' AND m.name IN ({','.join('?' * len(tables))})",
+            tables,
+        )
+    }
+    with conn:
+        for table, column, alter, backfill in _MIGRATIONS:
+            if (table, column) in existing:
+                continue
+            conn.execute(alter)
+            if backfill:
+                conn.execute(backfill)
+        for stmt in _INDEXES:
+            conn.execute(stmt)
+
 def upsert_script(name: str, path: str, tags: str = "", description: str = "") -> int:
-    with get_conn() as conn:
+    with _writer() as conn:
         cur = conn.execute(
             """
             INSERT INTO scripts(name, path, tags, description)
@@ -116,38 +328,49 @@ def upsert_script(name: str, path: str, tags: str = "", description: str = "") -
               name=excluded.name,
               tags=excluded.tags,
               description=excluded.description
+            RETURNING id
             """,
             (name, path, tags, description),
         )
-        return cur.lastrowid or conn.execute("SELECT id FROM scripts WHERE path=?", (path,)).fetchone()[0]
+        return cur.fetchone()[0]
 
-def list_scripts() -> Iterable[Tuple]:
-    with get_conn() as conn:
+def upsert_scripts_bulk(rows: Iterable[tuple]):
+    """Upsert many (name, path, tags, description, folder_id) rows with one executemany."""
+    with _writer() as conn:
+        conn.executemany(_SQL_UPSERT_SCRIPT_IN_FOLDER, rows)
+
+def list_scripts() -> list[sqlite3.Row]:
+    with _read_conn() as conn:
         return conn.execute(
             "SELECT id, name, path, tags, description, last_run, run_count, folder_id FROM scripts ORDER BY id DESC"
         ).fetchall()
 
+def get_script(sid: int) -> Optional[sqlite3.Row]:
+    with _read_conn() as conn:
+        return conn.execute(
+            "SELECT id, name, path, tags, description, last_run, run_count, folder_id FROM scripts WHERE id=?",
+            (sid,),
+        ).fetchone()
+
 def update_meta(sid: int, name: str, tags: str, description: str):
-    with get_conn() as conn:
+    with _writer() as conn:
         conn.execute(
             "UPDATE scripts SET name=?, tags=?, description=? WHERE id=?",
             (name, tags, description, sid),
         )
 
-def bump_run(sid: int, run_time_iso: str):
-    with get_conn() as conn:
-        conn.execute(
-            "UPDATE scripts SET last_run=?, run_count=COALESCE(run_count,0)+1 WHERE id=?",
-            (run_time_iso, sid),
-        )
+def record_run(sid: int, run_time_iso: str):
+    """Bump the script's last_run and run_count."""
+    with _writer() as conn:
+        conn.execute(_SQL_BUMP_RUN, (run_time_iso, sid))
 
 def delete_script(sid: int):
-    with get_conn() as conn:
+    with _writer() as conn:
         conn.execute("DELETE FROM scripts WHERE id=?", (sid,))
 
 # ----- Folders -----
-def list_folders(parent_id: Optional[int] = None) -> Iterable[Tuple]:
-    with get_conn() as conn:
+def list_folders(parent_id: Optional[int] = None) -> list[sqlite3.Row]:
+    with _read_conn() as conn:
         if parent_id is None:
             return conn.execute(
                 "SELECT id, name, parent_id, position FROM folders WHERE parent_id IS NULL ORDER BY position, name"
@@ -158,165 +381,181 @@ def list_folders(parent_id: Optional[int] = None) -> Iterable[Tuple]:
                 (parent_id,),
             ).fetchall()
 
-def list_all_folders() -> Iterable[Tuple]:
-    with get_conn() as conn:
+def list_all_folders() -> list[sqlite3.Row]:
+    with _read_conn() as conn:
         return conn.execute(
-            "SELECT id, name, parent_id, position FROM folders ORDER BY parent_id NULLS FIRST, position, name"
+            "SELECT id, name, parent_id, position FROM folders ORDER BY parent_id NULLS FIRST, position, name COLLATE NOCASE"
         ).fetchall()
 
 def create_folder(name: str, parent_id: Optional[int] = None) -> int:
-    with get_conn() as conn:
-        # Determine next position within the parent
-        if parent_id is None:
-            row = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM folders WHERE parent_id IS NULL").fetchone()
-        else:
-            row = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM folders WHERE parent_id=?", (parent_id,)).fetchone()
-        pos = row[0] if row else 0
+    with _writer() as conn:
+        # Next position within the parent is computed inline ("IS ?" also matches NULL)
         cur = conn.execute(
-            "INSERT INTO folders(name, parent_id, position) VALUES(?,?,?)",
-            (name, parent_id, pos),
+            "INSERT INTO folders(name, parent_id, position) "
+            "VALUES(?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM folders WHERE parent_id IS ?))",
+            (name, parent_id, parent_id),
         )
         return cur.lastrowid
 
 def rename_folder(folder_id: int, name: str):
-    with get_conn() as conn:
+    with _writer() as conn:
         conn.execute("UPDATE folders SET name=? WHERE id=?", (name, folder_id))
 
 def delete_folder(folder_id: int):
-    with get_conn() as conn:
+    with _writer() as conn:
         conn.execute("DELETE FROM folders WHERE id=?", (folder_id,))
 
 def move_folder(folder_id: int, new_parent_id: Optional[int], new_position: Optional[int] = None):
-    with get_conn() as conn:
+    with _writer() as conn:
         if new_position is None:
-            if new_parent_id is None:
-                row = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM folders WHERE parent_id IS NULL").fetchone()
-            else:
-                row = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM folders WHERE parent_id=?", (new_parent_id,)).fetchone()
-            new_position = row[0] if row else 0
-        conn.execute("UPDATE folders SET parent_id=?, position=? WHERE id=?", (new_parent_id, new_position, folder_id))
+            conn.execute(
+                "UPDATE folders SET parent_id=?, "
+                "position=(SELECT COALESCE(MAX(position), -1) + 1 FROM folders WHERE parent_id IS ?) "
+                "WHERE id=?",
+                (new_parent_id, new_parent_id, folder_id),
+            )
+        else:
+            conn.execute("UPDATE folders SET parent_id=?, position=? WHERE id=?", (new_parent_id, new_position, folder_id))
 
 def assign_script_folder(script_id: int, folder_id: Optional[int]):
-    with get_conn() as conn:
-        conn.execute("UPDATE scripts SET folder_id=? WHERE id=?", (folder_id, script_id))
+    with _writer() as conn:
+        conn.execute(_SQL_ASSIGN_FOLDER, (folder_id, script_id))
 
-def list_scripts_in_folder(folder_id: Optional[int]) -> Iterable[Tuple]:
-    with get_conn() as conn:
+def list_scripts_in_folder(folder_id: Optional[int]) -> list[sqlite3.Row]:
+    with _read_conn() as conn:
         if folder_id is None:
             return conn.execute(
-                "SELECT id, name, path, tags, description, last_run, run_count, folder_id FROM scripts WHERE folder_id IS NULL ORDER BY name"
+                "SELECT id, name, path, tags, description, last_run, run_count, folder_id FROM scripts WHERE folder_id IS NULL ORDER BY name COLLATE NOCASE"
             ).fetchall()
         else:
             return conn.execute(
-                "SELECT id, name, path, tags, description, last_run, run_count, folder_id FROM scripts WHERE folder_id=? ORDER BY name",
+                "SELECT id, name, path, tags, description, last_run, run_count, folder_id FROM scripts WHERE folder_id=? ORDER BY name COLLATE NOCASE",
                 (folder_id,),
             ).fetchall()
 
+def list_scripts_by_folder() -> list[sqlite3.Row]:
+    """Every script, ordered so rows of the same folder are adjacent (root/NULL first)."""
+    with _read_conn() as conn:
+        return conn.execute(
+            "SELECT id, name, path, tags, description, last_run, run_count, folder_id FROM scripts "
+            "ORDER BY folder_id, name COLLATE NOCASE"
+        ).fetchall()
+
 # ----- Script extras (args schema/values, venv) -----
-def get_script_extras(sid: int) -> Dict[str, Any]:
-    with get_conn() as conn:
+class ScriptExtras(NamedTuple):
+    args_schema: Optional[str] = None
+    args_values: Optional[str] = None
+    venv_id: Optional[int] = None
+    working_dir: Optional[str] = None
+
+_NO_EXTRAS = ScriptExtras()
+
+def get_script_extras(sid: int) -> ScriptExtras:
+    with _read_conn() as conn:
         row = conn.execute(
             "SELECT args_schema, args_values, venv_id, working_dir FROM scripts WHERE id=?",
             (sid,),
         ).fetchone()
         if not row:
-            return {"args_schema": None, "args_values": None, "venv_id": None, "working_dir": None}
-        return {"args_schema": row[0], "args_values": row[1], "venv_id": row[2], "working_dir": row[3]}
+            return _NO_EXTRAS
+        return ScriptExtras(*row)
 
 def update_args_schema(sid: int, schema_json: Optional[str]):
-    with get_conn() as conn:
-        conn.execute("UPDATE scripts SET args_schema=? WHERE id=?", (schema_json, sid))
+    with _writer() as conn:
+        conn.execute(_SQL_SET_ARGS_SCHEMA, (schema_json, sid))
 
 def update_args_values(sid: int, values_json: Optional[str]):
-    with get_conn() as conn:
-        conn.execute("UPDATE scripts SET args_values=? WHERE id=?", (values_json, sid))
+    with _writer() as conn:
+        conn.execute(_SQL_SET_ARGS_VALUES, (values_json, sid))
 
 def set_script_venv(sid: int, venv_id: Optional[int]):
-    with get_conn() as conn:
-        conn.execute("UPDATE scripts SET venv_id=? WHERE id=?", (venv_id, sid))
+    with _writer() as conn:
+        conn.execute(_SQL_SET_VENV, (venv_id, sid))
 
 def set_working_dir(sid: int, working_dir: Optional[str]):
-    with get_conn() as conn:
-        conn.execute("UPDATE scripts SET working_dir=? WHERE id=?", (working_dir, sid))
+    with _writer() as conn:
+        conn.execute(_SQL_SET_WORKING_DIR, (working_dir, sid))
 
 # ----- Venvs CRUD -----
 def upsert_venv(name: str, path: str, python_path: str) -> int:
-    now = datetime.now(timezone.utc).isoformat()
-    with get_conn() as conn:
+    with _writer() as conn:
         cur = conn.execute(
-            """
-            INSERT INTO venvs(name, path, python_path, created_at, last_used_at)
-            VALUES(?,?,?,?,?)
+            f"""
+            INSERT INTO venvs(name, path, python_path, created_at, last_used_at_ms)
+            VALUES(?,?,?,{_SQL_NOW},{_SQL_NOW_MS})
             ON CONFLICT(path) DO UPDATE SET
               name=excluded.name,
               python_path=excluded.python_path
+            RETURNING id
             """,
-            (name, path, python_path, now, now),
+            (name, path, python_path),
         )
-        return cur.lastrowid or conn.execute("SELECT id FROM venvs WHERE path=?", (path,)).fetchone()[0]
+        return cur.fetchone()[0]
 
-def list_venvs() -> Iterable[Tuple]:
-    with get_conn() as conn:
+def list_venvs() -> list[sqlite3.Row]:
+    with _read_conn() as conn:
         return conn.execute(
-            "SELECT id, name, path, python_path, created_at, last_used_at FROM venvs ORDER BY id DESC"
+            "SELECT id, name, path, python_path, created_at, last_used_at_ms FROM venvs ORDER BY id DESC"
         ).fetchall()
 
-def get_venv(venv_id: int) -> Optional[Tuple]:
-    with get_conn() as conn:
+def get_venv(venv_id: int) -> Optional[sqlite3.Row]:
+    with _read_conn() as conn:
         return conn.execute(
-            "SELECT id, name, path, python_path, created_at, last_used_at FROM venvs WHERE id=?",
+            "SELECT id, name, path, python_path, created_at, last_used_at_ms FROM venvs WHERE id=?",
             (venv_id,),
         ).fetchone()
 
 def delete_venv(venv_id: int):
-    with get_conn() as conn:
+    with _writer() as conn:
         conn.execute("DELETE FROM venvs WHERE id=?", (venv_id,))
 
-def touch_venv_last_used(venv_id: int):
-    now = datetime.now(timezone.utc).isoformat()
-    with get_conn() as conn:
-        conn.execute("UPDATE venvs SET last_used_at=? WHERE id=?", (now, venv_id))
-
 # ----- Option history -----
 def upsert_option_history(script_id: int, option: str, value: str, keep: int = 20):
     if not value:
         return
-    now = datetime.now(timezone.utc).isoformat()
-    with get_conn() as conn:
-        conn.execute(
-            """
-            INSERT INTO option_history(script_id, option, value, last_used_at, use_count)
-            VALUES(?,?,?,?,1)
-            ON CONFLICT(script_id, option, value) DO UPDATE SET
-              last_used_at=excluded.last_used_at,
-              use_count=option_history.use_count+1
-            """,
-            (script_id, option, value, now),
-        )
-        # prune
-        conn.execute(
-            """
-            DELETE FROM option_history
-            WHERE script_id=? AND option=? AND id NOT IN (
-              SELECT id FROM option_history
-              WHERE script_id=? AND option=?
-              ORDER BY last_used_at DESC, use_count DESC, id DESC
-              LIMIT ?
+    # Upsert and prune commit together as one transaction
+    with _writer() as conn:
+        use_count = conn.execute(_SQL_OPTHIST_UPSERT, (script_id, option, value)).fetchone()[0]
+        # Re-using an existing value cannot grow the history; only prune after a fresh insert
+        if use_count != 1:
+            return
+        excess = conn.execute(_SQL_OPTHIST_COUNT, (script_id, option)).fetchone()[0] - keep
+        if excess > 0:
+            conn.execute(_SQL_OPTHIST_PRUNE, (script_id, option, excess))
+
+def upsert_option_history_bulk(script_id: int, pairs: Iterable[tuple[str, str]], keep: int = 20):
+    """upsert_option_history for many (option, value) pairs in one transaction."""
+    rows = [(script_id, option, value) for option, value in pairs if value]
+    if not rows:
+        return
+    options = sorted({r[1] for r in rows})
+    with _writer() as conn:
+        # executemany cannot RETURN use_count, so look up which values already exist
+        known = {
+            (option, value)
+            for option, value in conn.execute(
+                "SELECT option, value FROM option_history "
+                f"WHERE script_id=? AND option IN ({','.join('?' * len(options))})",
+                (script_id, *options),
             )
-            """,
-            (script_id, option, script_id, option, keep),
-        )
+        }
+        conn.executemany(_SQL_OPTHIST_UPSERT_MANY, rows)
+        # As in upsert_option_history: only options that gained a row can need pruning
+        for option in sorted({r[1] for r in rows if (r[1], r[2]) not in known}):
+            excess = conn.execute(_SQL_OPTHIST_COUNT, (script_id, option)).fetchone()[0] - keep
+            if excess > 0:
+                conn.execute(_SQL_OPTHIST_PRUNE, (script_id, option, excess))
 
 def list_option_history(script_id: int, option: str, limit: int = 20) -> list[str]:
-    with get_conn() as conn:
+    with _read_conn() as conn:
         rows = conn.execute(
-            "SELECT value FROM option_history WHERE script_id=? AND option=? ORDER BY last_used_at DESC, use_count DESC, id DESC LIMIT ?",
+            "SELECT value FROM option_history WHERE script_id=? AND option=? ORDER BY last_used_at_ms DESC, use_count DESC, id DESC LIMIT ?",
             (script_id, option, limit),
         ).fetchall()
     return [r[0] for r in rows]
 
 def delete_option_history(script_id: int, option: str, value: str):
-    with get_conn() as conn:
+    with _writer() as conn:
         conn.execute(
             "DELETE FROM option_history WHERE script_id=? AND option=? AND value=?",
             (script_id, option, value),
@@ -324,30 +563,20 @@ def delete_option_history(script_id: int, option: str, value: str):
 
 # ----- AI Q&A history -----
 def add_ai_history(script_id: int, question: str, answer: str, keep: int = 100):
-    now = datetime.now(timezone.utc).isoformat()
-    with get_conn() as conn:
-        conn.execute(
-            "INSERT INTO ai_history(script_id, question, answer, created_at) VALUES(?,?,?,?)",
-            (script_id, question, answer, now),
-        )
+    with _writer() as conn:
+        conn.execute(_SQL_AIHIST_INSERT, (script_id, question, answer))
         # prune old rows keeping the latest 'keep'
-        conn.execute(
-            """
-            DELETE FROM ai_history
-            WHERE script_id=? AND id NOT IN (
-              SELECT id FROM ai_history WHERE script_id=? ORDER BY created_at DESC, id DESC LIMIT ?
-            )
-            """,
-            (script_id, script_id, keep),
-        )
+        excess = conn.execute(_SQL_AIHIST_COUNT, (script_id,)).fetchone()[0] - keep
+        if excess > 0:
+            conn.execute(_SQL_AIHIST_PRUNE, (script_id, excess))
 
-def list_ai_history(script_id: int, limit: int = 100):
-    with get_conn() as conn:
+def list_ai_history(script_id: int, limit: int = 100) -> list[sqlite3.Row]:
+    with _read_conn() as conn:
         return conn.execute(
             "SELECT id, created_at, question, answer FROM ai_history WHERE script_id=? ORDER BY created_at DESC, id DESC LIMIT ?",
             (script_id, limit),
         ).fetchall()
 
 def delete_ai_history(entry_id: int):
-    with get_conn() as conn:
+    with _writer() as conn:
         conn.execute("DELETE FROM ai_history WHERE id=?", (entry_id,))
@@ -1,34 +1,94 @@
 import sys
+import functools
+import operator
+import textwrap
+from collections import deque
 from pathlib import Path
+from typing import NamedTuple, Optional
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLineEdit, QTreeView, QTextEdit, QMessageBox, QAbstractItemView, QMenu,
-    QSplitter, QInputDialog, QStyle, QStyledItemDelegate, QStyleOptionViewItem, QHeaderView, QTabWidget
+    QPushButton, QLineEdit, QTreeView, QPlainTextEdit, QMessageBox, QAbstractItemView, QMenu,
+    QSplitter, QInputDialog, QStyle, QToolTip, QStyledItemDelegate, QStyleOptionViewItem, QHeaderView, QTabWidget
+)
+from PyQt6.QtCore import (
+    Qt, QSortFilterProxyModel, QSettings, QByteArray, QModelIndex, QSize, QTimer, QEvent,
+    QObject, QRunnable, QThreadPool, QItemSelection, QItemSelectionModel, QPersistentModelIndex, pyqtSignal
 )
-from PyQt6.QtCore import Qt, QSortFilterProxyModel, QRegularExpression, QSettings, QModelIndex, QSize
 from PyQt6.QtGui import QStandardItemModel, QStandardItem, QAction, QTextDocument, QTextCursor, QColor
 from repository import (
-    import_file, import_directory, fetch_all, save_meta, remove,
+    import_file, import_directory, fetch_all, fetch_one, save_meta, remove,
     folders_all, folder_create, folder_rename, folder_delete, folder_move,
-    assign_script_to_folder, scripts_in_folder
+    assign_script_to_folder, scripts_all_grouped, db_maintenance, batch
 )
 from runner import ScriptRunner
 from widgets import MetaEditDialog, ScriptDetailsPanel, AIAssistantPanel, CodePreviewPanel
 
-COLUMNS = ["名前", "タグ", "説明", "パス", "最終実行", "回数", "ID"]
+COLUMNS = ("名前", "タグ", "説明", "パス", "最終実行", "回数", "ID")
+# Script record fields in the order _make_script_row unpacks them
+_ROW_FIELDS = ("id", "name", "path", "tags", "description", "last_run", "run_count", "folder_id")
+_row_getter = operator.itemgetter(*_ROW_FIELDS)
+
+# Idle time after the last keystroke before the search filter is applied
+FILTER_DEBOUNCE_MS = 200
+
+# Log view: output is flushed to the widget at most this often, and capped in lines
+LOG_FLUSH_INTERVAL_MS = 50
+LOG_MAX_BLOCKS = 5000
+
+# Delay before expanded folders / header layout are written to QSettings
+VIEW_STATE_SAVE_DELAY_MS = 300
+
+# Interval for refreshing SQLite planner statistics during long sessions
+DB_MAINTENANCE_INTERVAL_MS = 3 * 60 * 60 * 1000
 
 # Roles for tree items
-ROLE_NODE_TYPE = Qt.ItemDataRole.UserRole + 1  # 'folder' or 'script'
-ROLE_NODE_ID = Qt.ItemDataRole.UserRole + 2    # folder_id or script_id
-ROLE_PATH = Qt.ItemDataRole.UserRole + 3       # script path
-ROLE_TAGS = Qt.ItemDataRole.UserRole + 4
-ROLE_DESC = Qt.ItemDataRole.UserRole + 5
+ROLE_NODE = Qt.ItemDataRole.UserRole + 1    # Node payload of a column-0 item
+ROLE_SEARCH = Qt.ItemDataRole.UserRole + 6  # casefolded row text matched by the search box
+
+
+class Node(NamedTuple):
+    """Everything a tree row needs besides its display text, stored under one role."""
+    kind: str = ""                # 'folder' or 'script'
+    id: Optional[int] = None      # folder_id / script_id; None for the <root> pseudo folder
+    path: str = ""
+    tags: str = ""
+    desc: str = ""
+
+_NO_NODE = Node()
+
+
+def _node(obj) -> Node:
+    """Node payload of an item or index (empty Node for columns > 0 / invalid)."""
+    return obj.data(ROLE_NODE) or _NO_NODE
+
+
+@functools.lru_cache(maxsize=4096)
+def _wrap_tooltip_text(text: str, width: int = 60) -> str:
+    # Pure function of (text, width); cached since the same descriptions are hovered repeatedly
+    if not text:
+        return ""
+    try:
+        w = int(width) if width and int(width) > 0 else 60
+    except Exception:
+        w = 60
+    lines = []
+    for para in str(text).splitlines() or [""]:
+        # Breaks at whitespace, splitting words longer than the width
+        lines.extend(textwrap.wrap(para, width=w) or [""])
+    return "\n".join(lines)
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("ScriptDeck")
         self.resize(1100, 720)
+        self._settings = QSettings("ScriptDeck", "ScriptDeck")
+        # Expand/collapse and header resize bursts are persisted once they settle
+        self._state_timer = QTimer(self)
+        self._state_timer.setSingleShot(True)
+        self._state_timer.setInterval(VIEW_STATE_SAVE_DELAY_MS)
+        self._state_timer.timeout.connect(self._flush_view_state)
 
         # --- Top bar ---
         top = QWidget()
@@ -46,16 +106,23 @@ class MainWindow(QMainWindow):
         top_layout.addWidget(btn_import)
         # 実行/停止ボタンは右ペインに配置するため左側には置かない
 
+        self._build_context_menus()
+        # Row icons are shared by every folder/script item
+        self._icon_folder = self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon)
+        self._icon_file = self.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon)
+
         # --- Tree (folders + scripts) ---
         self.model = QStandardItemModel(0, len(COLUMNS), self)
-        self.model.setHorizontalHeaderLabels(COLUMNS)
+        self.model.setHorizontalHeaderLabels(list(COLUMNS))
         self.proxy = RecursiveFilterProxyModel(self)
+        # Ancestors of matching rows are kept by Qt itself (no Python-side DFS)
+        self.proxy.setRecursiveFilteringEnabled(True)
         self.proxy.setSourceModel(self.model)
-        self.proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
 
         self.table = ScriptTreeView(self)
         self.table.setModel(self.proxy)
         self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        # Items keep their default flags; editing is disabled once here for the whole view
         self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.table.customContextMenuRequested.connect(self._context_menu)
@@ -70,8 +137,11 @@ class MainWindow(QMainWindow):
             hdr = self.table.header()
             hdr.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
             # Persist header state whenever user resizes or moves columns
-            hdr.sectionResized.connect(lambda *_: self._save_header_state())
-            hdr.sectionMoved.connect(lambda *_: self._save_header_state())
+            hdr.sectionResized.connect(lambda *_: self._state_timer.start())
+            hdr.sectionMoved.connect(lambda *_: self._state_timer.start())
+            # Column widths are never re-measured on reload; fit them on demand only
+            hdr.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+            hdr.customContextMenuRequested.connect(self._header_context_menu)
         except Exception:
             pass
         # Single-line in view with ellipsis; multi-line preview via tooltip
@@ -84,9 +154,12 @@ class MainWindow(QMainWindow):
             pass
 
         # --- Log (will be placed under right pane) ---
-        self.log = QTextEdit()
+        # Plain-text document: cheaper appends than QTextEdit's rich-text one
+        self.log = QPlainTextEdit()
         self.log.setReadOnly(True)
         self.log.setPlaceholderText("実行ログがここに表示されます")
+        # Bound memory for very chatty scripts; oldest lines are dropped
+        self.log.setMaximumBlockCount(LOG_MAX_BLOCKS)
 
         # Right details panel (top of right vertical split)
         self.details = ScriptDetailsPanel(self)
@@ -124,8 +197,15 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.split_main)
 
         # Runner
-        self._logs_by_sid: dict[int, str] = {}
+        # Per-script log chunks, capped like the view; joined only when a script's log is shown
+        self._logs_by_sid: dict[int, _LogBuffer] = {}
         self._display_sid: int | None = None
+        # Pending text for the displayed script, written to the view by _flush_log
+        self._log_pending: list[str] = []
+        self._log_flush_timer = QTimer(self)
+        self._log_flush_timer.setSingleShot(True)
+        self._log_flush_timer.setInterval(LOG_FLUSH_INTERVAL_MS)
+        self._log_flush_timer.timeout.connect(self._flush_log)
         self.runner = ScriptRunner(self)
         self.runner.started.connect(self.on_started)
         self.runner.stdout.connect(self._append_log)
@@ -133,7 +213,14 @@ class MainWindow(QMainWindow):
         self.runner.finished.connect(self.on_finished)
 
         # Signals
-        self.search.textChanged.connect(self._apply_filter)
+        # Coalesce keystrokes so fast typing re-filters the tree only once
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(FILTER_DEBOUNCE_MS)
+        self._filter_timer.timeout.connect(lambda: self._apply_filter(self.search.text()))
+        self.search.textChanged.connect(lambda *_: self._filter_timer.start())
+        # Enter applies the pending filter right away
+        self.search.returnPressed.connect(self._flush_filter)
         btn_new_folder.clicked.connect(self._on_new_folder_top)
         btn_add.clicked.connect(self.add_script)
         btn_import.clicked.connect(self.import_folder)
@@ -150,79 +237,120 @@ class MainWindow(QMainWindow):
         self._suppress_selection_changed = False
 
         self._running_sids: set[int] = set()
+        # sid -> row items of the script, rebuilt by reload_tree
+        self._script_items: dict[int, list[QStandardItem]] = {}
+        # folder id -> column 0 item of the folder (pseudo root excluded)
+        self._folder_items: dict[int, QStandardItem] = {}
+        # column 0 item of the <root> pseudo folder
+        self._root_item: QStandardItem | None = None
+        # folder id -> parent folder id (None = root), rebuilt by reload_tree
+        self._folder_parent: dict[int, int | None] = {}
+        # Periodic DB maintenance (PRAGMA optimize) for long-running sessions
+        self._db_maint_timer = QTimer(self)
+        self._db_maint_timer.setInterval(DB_MAINTENANCE_INTERVAL_MS)
+        self._db_maint_timer.timeout.connect(db_maintenance)
+        self._db_maint_timer.start()
+        # Tree data is read on a pool thread; only the newest request is applied.
+        # One thread that never expires, so its per-thread db connections are
+        # opened once instead of once per idle-expired pool thread
+        self._db_pool = QThreadPool(self)
+        self._db_pool.setMaxThreadCount(1)
+        self._db_pool.setExpiryTimeout(-1)
+        self._tree_gen = 0
+        # Set once the first fetch is applied; until then the tree holds no
+        # folders and its expansion state must not overwrite the saved one
+        self._tree_built = False
+        self._tree_select_sid: int | None = None
+        self._tree_fetch = _TreeFetchSignals(self)
+        self._tree_fetch.done.connect(self._on_tree_fetched)
         self._restore_ui_state()
         # Initial state: no script selected -> hide right pane
         self._update_right_pane_visibility(False)
+        # The first build restores the saved expanded folders
         self.reload_tree()
-        self._restore_tree_state()
 
     # ----- Data -----
-    def reload_tree(self):
+    def reload_tree(self, select_sid: int | None = None):
+        """Re-read folders/scripts off the GUI thread and rebuild the tree when they arrive.
+
+        select_sid, if given, is selected once the new tree is built.
+        """
+        self._tree_gen += 1
+        if select_sid is not None:
+            self._tree_select_sid = int(select_sid)
+        self._db_pool.start(_TreeFetchTask(self._tree_gen, self._tree_fetch))
+
+    def _on_tree_fetched(self, gen: int, data):
+        # A newer reload_tree was requested meanwhile; its result will follow
+        if gen != self._tree_gen or data is None:
+            return
+        all_folders, scripts_by_folder = data
+        # No repaints while rows are replaced and expansion state is re-applied;
+        # the selection the rebuild drops is not the user clearing it
+        self.table.setUpdatesEnabled(False)
+        self._suppress_selection_changed = True
+        try:
+            self._build_tree(all_folders, scripts_by_folder)
+            self._tree_built = True
+        finally:
+            self._suppress_selection_changed = False
+            self.table.setUpdatesEnabled(True)
+        sid, self._tree_select_sid = self._tree_select_sid, None
+        if sid is not None:
+            self._select_by_id(sid)
+
+    def _build_tree(self, all_folders: list[tuple], scripts_by_folder: dict):
         # Snapshot currently expanded folder IDs to preserve state across reloads
         expanded_snapshot = self._collect_expanded_ids()
-        # Suppress selection-changed side effects while rebuilding the model
-        self._suppress_selection_changed = True
         self.model.removeRows(0, self.model.rowCount())
-        # Build mapping for folders
-        all_folders = list(folders_all())  # (id, name, parent_id, position)
+        self._script_items.clear()
+        self._folder_items.clear()
+        # Build mapping for folders; rows are (id, name, parent_id, position),
+        # already ordered by (position, name) within each parent by the query
         by_parent: dict[object, list[tuple]] = {}
         for f in all_folders:
             by_parent.setdefault(f[2], []).append(f)
-        for k in list(by_parent.keys()):
-            by_parent[k].sort(key=lambda x: (x[3], x[1].lower()))
+        # Id-only view of the hierarchy for descendant checks (drag & drop)
+        self._folder_parent = {f[0]: f[2] for f in all_folders}
 
         def make_row(name: str) -> list[QStandardItem]:
-            row = [QStandardItem("") for _ in range(len(COLUMNS))]
-            row[0].setText(name)
-            try:
-                row[0].setToolTip(name or "")
-            except Exception:
-                pass
-            for it in row:
-                it.setEditable(False)
+            # Folder rows only carry a name; leave the other columns item-less
+            row = [QStandardItem(name)]
+            row[0].setData(self._search_text((name,)), ROLE_SEARCH)
             return row
 
-        def add_folder(parent_item: QStandardItem, folder_row: tuple):
+        def add_folder(parent_item: QStandardItem, folder_row: tuple) -> QStandardItem:
             fid, name, parent_id, position = folder_row
             row_items = make_row(name)
-            try:
-                row_items[0].setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon))
-            except Exception:
-                pass
-            row_items[0].setData('folder', ROLE_NODE_TYPE)
-            row_items[0].setData(int(fid), ROLE_NODE_ID)
+            row_items[0].setIcon(self._icon_folder)
+            row_items[0].setData(Node('folder', int(fid)), ROLE_NODE)
+            self._folder_items[int(fid)] = row_items[0]
             parent_item.appendRow(row_items)
-            parent_for_children = row_items[0]
-            # Add subfolders first (folders should appear above files)
-            for ch in by_parent.get(fid, []) or []:
-                add_folder(parent_for_children, ch)
-            # Then add scripts under this folder
-            for s in scripts_in_folder(fid):
-                srow = self._make_script_row(s)
-                parent_for_children.appendRow(srow)
+            return row_items[0]
 
         inv_root = self.model.invisibleRootItem()
         # Visible pseudo root folder
         root_row = make_row("<root>")
-        try:
-            root_row[0].setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon))
-        except Exception:
-            pass
-        root_row[0].setData('folder', ROLE_NODE_TYPE)
+        root_row[0].setIcon(self._icon_folder)
         # Use None to represent top-level root (no DB id)
-        root_row[0].setData(None, ROLE_NODE_ID)
-        inv_root.appendRow(root_row)
+        root_row[0].setData(Node('folder', None), ROLE_NODE)
         vis_root = root_row[0]
-        # Root folders first
-        for f in by_parent.get(None, []) or []:
-            add_folder(vis_root, f)
-        # Then root scripts
-        for s in scripts_in_folder(None):
-            srow = self._make_script_row(s)
-            vis_root.appendRow(srow)
+        self._root_item = vis_root
+        # Build the whole subtree while the pseudo root is still detached so
+        # the model (and the filter proxy) sees a single rowsInserted.
+        # Explicit stack instead of recursion: each popped folder gets all of
+        # its rows at once -- subfolders first (folders should appear above
+        # files), then its scripts -- so row order matches a DFS build.
+        stack: list[tuple[QStandardItem, object]] = [(vis_root, None)]
+        while stack:
+            parent_item, fid = stack.pop()
+            for ch in by_parent.get(fid, ()):
+                stack.append((add_folder(parent_item, ch), ch[0]))
+            for s in scripts_by_folder.get(fid, ()):
+                parent_item.appendRow(self._make_script_row(s))
+        inv_root.appendRow(root_row)
 
         # Do not auto-resize columns here so restored widths persist
-        self._suppress_selection_changed = False
         # Restore expanded state after rebuild, preferring in-session snapshot
         if expanded_snapshot:
             self._apply_expanded_ids(expanded_snapshot)
@@ -239,57 +367,162 @@ class MainWindow(QMainWindow):
 
     def _make_script_row(self, r: dict | tuple) -> list[QStandardItem]:
         if isinstance(r, dict):
-            sid = r.get("id")
-            name = r.get("name") or ""
-            path = r.get("path") or ""
-            tags = r.get("tags") or ""
-            desc = r.get("description") or ""
-            last_run = r.get("last_run") or ""
-            run_count = str(r.get("run_count") or 0)
-        else:
-            sid, name, path, tags, desc, last_run, run_count, _folder_id = r
-            run_count = str(run_count or 0)
-        items = [QStandardItem("") for _ in range(len(COLUMNS))]
-        # Ensure display shows .py extension for clarity
-        display_name = name if str(name).lower().endswith('.py') else (name + '.py' if name else name)
-        items[0].setText(display_name)
+            r = _row_getter(r)
+        sid, name, path, tags, desc, last_run, run_count, _folder_id = r
+        name, path, tags, desc, last_run = name or "", path or "", tags or "", desc or "", last_run or ""
+        run_count = str(run_count or 0)
+        # Items are created with their text (column order of COLUMNS; path
+        # comes after description) instead of blank + setText per cell
+        texts = (self._display_name(name), tags, desc, path, last_run, run_count, str(sid))
+        items = [QStandardItem(text) for text in texts]
         # Set a generic file icon for scripts
+        items[0].setIcon(self._icon_file)
+        items[0].setData(Node('script', int(sid), path, tags, desc), ROLE_NODE)
+        items[0].setData(self._search_text(texts), ROLE_SEARCH)
         try:
-            items[0].setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon))
+            self._script_items[int(sid)] = items
         except Exception:
             pass
+        return items
+
+    def update_one(self, sid: int) -> bool:
+        """Refresh the cells of a single script row in place.
+
+        Returns False when the row is unknown so callers can fall back to reload_tree.
+        """
+        items = self._script_items.get(int(sid))
+        if items is None:
+            return False
+        r = fetch_one(int(sid))
+        if r is None:
+            return False
+        name = r["name"] or ""
+        values = {
+            0: self._display_name(name),
+            1: r["tags"] or "",
+            2: r["description"] or "",
+            3: r["path"] or "",
+            4: r["last_run"] or "",
+            5: str(r["run_count"] or 0),
+        }
+        # Only touch cells whose text actually changed
+        old_name = items[0].text()
+        changed = meta_changed = False
+        for col, val in values.items():
+            if items[col].text() != val:
+                items[col].setText(val)
+                changed = True
+                if col <= 3:
+                    meta_changed = True
+        if meta_changed:
+            items[0].setData(Node('script', int(sid), values[3], values[1], values[2]), ROLE_NODE)
+        if items[0].text() != old_name:
+            self._resort_row(items[0])
+        if changed:
+            old_search = items[0].data(ROLE_SEARCH) or ""
+            new_search = self._search_text(item.text() for item in items)
+            items[0].setData(new_search, ROLE_SEARCH)
+            # dataChanged updates a row whose match result holds; only a flip can
+            # change an ancestor's visibility, which it alone would miss
+            if self.proxy.matches(old_search) != self.proxy.matches(new_search):
+                self.proxy.refilter()
+        return True
+
+    def _resort_row(self, item: QStandardItem):
+        """Move a renamed script row to its sorted position among its siblings."""
+        parent = item.parent() or self.model.invisibleRootItem()
+        sel = self.table.selectionModel()
+        pidx = self.proxy.mapFromSource(item.index())
+        was_selected = pidx.isValid() and sel.isSelected(pidx)
+        # The view moves current/selection to a neighbour when the row is taken;
+        # keep the old ones to put back afterwards
+        selected = [QPersistentModelIndex(i) for i in sel.selectedRows() if i != pidx]
+        current = None if sel.currentIndex() == pidx else QPersistentModelIndex(sel.currentIndex())
+        # Taking a selected row deselects it; that must not reset the right pane
+        self._suppress_selection_changed = True
         try:
-            items[0].setToolTip(display_name or "")
-        except Exception:
-            pass
-        items[1].setText(tags)
-        try:
-            items[1].setToolTip(tags or "")
-        except Exception:
-            pass
-        items[2].setText(desc)
-        # Show multi-line wrapped description in tooltip
-        try:
-            items[2].setToolTip(self._wrap_tooltip_text(desc or ""))
-        except Exception:
-            pass
-        # Path moves next after description
-        items[3].setText(path)
+            taken = parent.takeRow(item.row())
+            parent.insertRow(self._insert_row_for(parent, 'script', item.text()), taken)
+            pidx = self.proxy.mapFromSource(item.index())
+            selection = QItemSelection()
+            for i in selected:
+                if i.isValid():
+                    selection.select(QModelIndex(i), QModelIndex(i))
+            if was_selected and pidx.isValid():
+                selection.select(pidx, pidx)
+            flags = QItemSelectionModel.SelectionFlag
+            sel.select(selection, flags.ClearAndSelect | flags.Rows)
+            sel.setCurrentIndex(pidx if current is None else QModelIndex(current), flags.NoUpdate)
+        finally:
+            self._suppress_selection_changed = False
+
+    @staticmethod
+    def _search_text(texts) -> str:
+        # Every visible cell of the row, casefolded once (Unicode-aware, unlike SQLite LIKE)
+        return " \t".join(t for t in texts if t).casefold()
+
+    def remove_one(self, sid: int) -> bool:
+        """Drop a single script row from the tree; False if it is not in the tree."""
+        items = self._script_items.pop(int(sid), None)
+        if items is None:
+            return False
+        parent = items[0].parent() or self.model.invisibleRootItem()
+        parent.removeRow(items[0].row())
+        return True
+
+    def move_rows(self, moves: list[tuple[str, int]], folder_id: int | None) -> bool:
+        """Re-parent rows whose move is already stored, without rebuilding the tree.
+
+        moves holds (kind, id) pairs. Returns False when the destination or a row
+        is unknown so callers can fall back to reload_tree.
+        """
+        dest = self._root_item if folder_id is None else self._folder_items.get(int(folder_id))
+        if dest is None:
+            return False
+        rows = []
+        for kind, nid in moves:
+            if kind == 'script':
+                items = self._script_items.get(nid)
+                item = items[0] if items else None
+            else:
+                item = self._folder_items.get(nid)
+            if item is None or item.parent() is None:
+                return False
+            rows.append((kind, nid, item))
+        expanded = self._collect_expanded_ids()
+        # Taking a selected row deselects it; that must not reset the right pane
+        self._suppress_selection_changed = True
         try:
-            items[3].setToolTip(path or "")
-        except Exception:
-            pass
-        items[4].setText(last_run)
-        items[5].setText(run_count)
-        items[6].setText(str(sid))
-        for it in items:
-            it.setEditable(False)
-        items[0].setData('script', ROLE_NODE_TYPE)
-        items[0].setData(int(sid), ROLE_NODE_ID)
-        items[0].setData(path, ROLE_PATH)
-        items[0].setData(tags, ROLE_TAGS)
-        items[0].setData(desc, ROLE_DESC)
-        return items
+            for kind, nid, item in rows:
+                taken = item.parent().takeRow(item.row())
+                dest.insertRow(self._insert_row_for(dest, kind, item.text()), taken)
+                if kind == 'folder':
+                    self._folder_parent[nid] = folder_id
+        finally:
+            self._suppress_selection_changed = False
+        # Moved folders come back collapsed; restore what was open
+        self._apply_expanded_ids(expanded)
+        return True
+
+    @staticmethod
+    def _insert_row_for(dest: QStandardItem, kind: str, text: str) -> int:
+        # Same order as _build_tree: subfolders first (a moved folder gets the
+        # next position, i.e. goes last among them), then scripts by name
+        n = dest.rowCount()
+        r = 0
+        while r < n and _node(dest.child(r, 0)).kind == 'folder':
+            r += 1
+        if kind == 'folder':
+            return r
+        key = text.lower()
+        while r < n and dest.child(r, 0).text().lower() <= key:
+            r += 1
+        return r
+
+    @staticmethod
+    def _display_name(name: str) -> str:
+        # Ensure display shows .py extension for clarity
+        return name if str(name).lower().endswith('.py') else (name + '.py' if name else name)
 
     # ----- Actions -----
     def add_script(self):
@@ -299,9 +532,8 @@ class MainWindow(QMainWindow):
         try:
             folder_id = self._current_folder_id()
             sid = import_file(Path(path), folder_id=folder_id)
-            self.reload_tree()
-            # Select the newly added script
-            self._select_by_id(sid)
+            # Select the newly added script once the tree is rebuilt
+            self.reload_tree(select_sid=sid)
         except Exception as e:
             QMessageBox.critical(self, "エラー", str(e))
 
@@ -326,18 +558,21 @@ class MainWindow(QMainWindow):
         # Normalize to column 0 so we always read roles from the first column
         src0 = self.model.index(src.row(), 0, src.parent())
         item = self.model.itemFromIndex(src0)
-        if item is None or item.data(ROLE_NODE_TYPE) != 'script':
+        node = _node(item) if item is not None else _NO_NODE
+        if node.kind != 'script':
             QMessageBox.information(self, "情報", "スクリプトを選択してください")
             return
-        sid = int(item.data(ROLE_NODE_ID))
-        path = item.data(ROLE_PATH)
+        self._launch(node.id, node.path)
+
+    def _launch(self, sid: int, path: str):
         # Clear only the target script's log buffer (and view if displaying it)
         self._clear_log_for_sid(int(sid))
         args = self.details.build_args()
         pyexe = self.details.get_python_executable()
         wd = self.details.get_working_dir()
+        # Every launch is saved: it also bumps the option history's use counts
         self.details.save_current_values()
-        self.runner.run(sid, path, args=args, python_executable=pyexe, working_dir=wd)
+        self.runner.run(int(sid), path, args=args, python_executable=pyexe, working_dir=wd)
 
     def on_started(self, sid: int, cmdline: str):
         self._append_log(sid, f"[RUN] {cmdline}\n")
@@ -349,36 +584,55 @@ class MainWindow(QMainWindow):
 
     def on_finished(self, sid: int, exitCode: int):
         self._append_log(sid, f"\n[EXIT] code={exitCode}\n")
+        # Show the tail of the run right away instead of on the next timer tick
+        self._flush_log()
         try:
             self._running_sids.discard(int(sid))
             self.table.viewport().update()
         except Exception:
             pass
-        # Reload tree while preserving the selection for the finished script
-        self.reload_tree()
+        # Only the run stats of the finished script change; update its row in place
         if sid is not None and sid >= 0:
-            self._select_by_id(sid)
+            if not self.update_one(sid):
+                self.reload_tree(select_sid=sid)
+            return
+        self.reload_tree()
 
     def _append_log(self, sid: int, s: str):
         # Append to per-script buffer first
-        prev = self._logs_by_sid.get(int(sid), "")
-        self._logs_by_sid[int(sid)] = prev + (s or "")
-        # If this script is currently displayed, mirror to the view
-        if self._display_sid is not None and int(sid) == int(self._display_sid):
+        if s:
+            buf = self._logs_by_sid.get(int(sid))
+            if buf is None:
+                buf = self._logs_by_sid[int(sid)] = _LogBuffer()
+            buf.append(s)
+        # If this script is currently displayed, queue it for the view
+        if s and self._display_sid is not None and int(sid) == int(self._display_sid):
+            self._log_pending.append(s)
+            if not self._log_flush_timer.isActive():
+                self._log_flush_timer.start()
+
+    def _flush_log(self):
+        if not self._log_pending:
+            return
+        text = "".join(self._log_pending)
+        self._log_pending.clear()
+        try:
+            self.log.moveCursor(QTextCursor.MoveOperation.End)
+            self.log.insertPlainText(text)
+            self.log.moveCursor(QTextCursor.MoveOperation.End)
+        except Exception:
             try:
-                self.log.moveCursor(QTextCursor.MoveOperation.End)
-                self.log.insertPlainText(s)
-                self.log.moveCursor(QTextCursor.MoveOperation.End)
+                self.log.insertPlainText(text)
             except Exception:
-                try:
-                    self.log.insertPlainText(s)
-                except Exception:
-                    pass
+                pass
 
     def _set_display_sid(self, sid: int | None):
         self._display_sid = int(sid) if sid is not None else None
+        # The full buffer below already contains any pending text
+        self._log_pending.clear()
         # Update the view to show the selected script's buffer
-        text = self._logs_by_sid.get(int(sid), "") if sid is not None else ""
+        buf = self._logs_by_sid.get(int(sid)) if sid is not None else None
+        text = buf.text() if buf is not None else ""
         try:
             self.log.setPlainText(text)
             self.log.moveCursor(QTextCursor.MoveOperation.End)
@@ -386,8 +640,9 @@ class MainWindow(QMainWindow):
             pass
 
     def _clear_log_for_sid(self, sid: int):
-        self._logs_by_sid[int(sid)] = ""
+        self._logs_by_sid.pop(int(sid), None)
         if self._display_sid is not None and int(self._display_sid) == int(sid):
+            self._log_pending.clear()
             try:
                 self.log.clear()
             except Exception:
@@ -395,45 +650,25 @@ class MainWindow(QMainWindow):
 
     # ----- Settings persistence -----
     def _restore_ui_state(self):
-        settings = QSettings("ScriptDeck", "ScriptDeck")
-        geom = settings.value("main/geometry")
-        if geom is not None:
-            try:
-                self.restoreGeometry(geom)
-            except Exception:
-                pass
-        s_main = settings.value("split/main")
-        if s_main is not None:
-            try:
-                self.split_main.restoreState(s_main)
-            except Exception:
-                pass
-        s_left = settings.value("split/left")
-        if s_left is not None:
-            try:
-                self.left_split.restoreState(s_left)
-            except Exception:
-                pass
-        s_right = settings.value("split/right")
-        if s_right is not None:
-            try:
-                self.right_split.restoreState(s_right)
-            except Exception:
-                pass
-        # Tree header (column widths/order)
-        try:
-            hst = settings.value("tree/header")
-            if hst is not None:
-                ba = hst
-                if isinstance(hst, (bytes, bytearray)):
-                    from PyQt6.QtCore import QByteArray as _QBA
-                    ba = _QBA(bytes(hst))
-                elif isinstance(hst, str):
-                    from PyQt6.QtCore import QByteArray as _QBA
-                    ba = _QBA(hst.encode('utf-8', errors='ignore'))
-                self.table.header().restoreState(ba)
-        except Exception:
-            pass
+        settings = self._settings
+        vals = {k: settings.value(k) for k in ("main/geometry", "split/main", "split/left", "split/right", "tree/header")}
+        targets = (
+            ("main/geometry", self.restoreGeometry),
+            ("split/main", self.split_main.restoreState),
+            ("split/left", self.left_split.restoreState),
+            ("split/right", self.right_split.restoreState),
+            # Tree header (column widths/order)
+            ("tree/header", self.table.header().restoreState),
+        )
+        for key, restore in targets:
+            v = vals.get(key)
+            # Some backends hand back bytes/str instead of QByteArray
+            if isinstance(v, (bytes, bytearray)):
+                v = QByteArray(bytes(v))
+            elif isinstance(v, str):
+                v = QByteArray(v.encode('utf-8', errors='ignore'))
+            if isinstance(v, QByteArray) and not v.isEmpty():
+                restore(v)
         # AI panel internal split sizes
         try:
             self.ai_panel.restore_settings(settings)
@@ -442,11 +677,18 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         try:
-            settings = QSettings("ScriptDeck", "ScriptDeck")
-            settings.setValue("main/geometry", self.saveGeometry())
-            settings.setValue("split/main", self.split_main.saveState())
-            settings.setValue("split/left", self.left_split.saveState())
-            settings.setValue("split/right", self.right_split.saveState())
+            self._state_timer.stop()
+            settings = self._settings
+            state = {
+                "main/geometry": self.saveGeometry(),
+                "split/main": self.split_main.saveState(),
+                "split/left": self.left_split.saveState(),
+                "split/right": self.right_split.saveState(),
+                # Tree header (column widths/order)
+                "tree/header": self.table.header().saveState(),
+            }
+            for key, value in state.items():
+                settings.setValue(key, value)
             # AI panel split
             self.ai_panel.save_settings(settings)
             # Save current AI UI state for the selected script
@@ -457,21 +699,18 @@ class MainWindow(QMainWindow):
                     pass
             # Save expanded folders in tree
             self._save_tree_state(settings)
-            # Save tree header (column widths/order)
-            try:
-                settings.setValue("tree/header", self.table.header().saveState())
-            except Exception:
-                pass
         except Exception:
             pass
         super().closeEvent(event)
 
     def _apply_filter(self, text: str):
         # 名前・タグ・説明・パスをまとめてフィルタ（大文字小文字無視／リテラル検索）
-        # ユーザ入力は正規表現としてではなく、リテラルとして扱う
-        regex = QRegularExpression(QRegularExpression.escape(text))
-        regex.setPatternOptions(QRegularExpression.PatternOption.CaseInsensitiveOption)
-        self.proxy.setFilterRegularExpression(regex)
+        # 行ごとに事前計算した表示テキスト（casefold済み）に対する部分一致で判定する
+        self.proxy.set_needle(text)
+
+    def _flush_filter(self):
+        self._filter_timer.stop()
+        self._apply_filter(self.search.text())
 
     def is_script_running(self, sid: int) -> bool:
         try:
@@ -479,25 +718,6 @@ class MainWindow(QMainWindow):
         except Exception:
             return False
 
-    def _wrap_tooltip_text(self, text: str, width: int = 60) -> str:
-        if not text:
-            return ""
-        try:
-            w = int(width) if width and int(width) > 0 else 60
-        except Exception:
-            w = 60
-        lines = []
-        for para in str(text).splitlines() or [""]:
-            s = para
-            while len(s) > w:
-                cut = s.rfind(" ", 0, w)
-                if cut <= 0:
-                    cut = w
-                lines.append(s[:cut])
-                s = s[cut:].lstrip()
-            lines.append(s)
-        return "\n".join(lines)
-
     def _current_index(self):
         sel = self.table.selectionModel().selectedIndexes()
         if not sel:
@@ -509,10 +729,9 @@ class MainWindow(QMainWindow):
 
     def _on_selection_changed(self, *_):
         # Ignore selection changes during model rebuilds
-        if getattr(self, '_suppress_selection_changed', False):
+        if self._suppress_selection_changed:
             return
-        idx = self._current_index()
-        if idx is None:
+        if not self.table.selectionModel().hasSelection():
             # 未選択になった場合のみ右ペインを未選択状態にする
             self._update_right_pane_visibility(False)
             try:
@@ -536,14 +755,13 @@ class MainWindow(QMainWindow):
             item = self.model.itemFromIndex(src0)
             if item is None:
                 return
-            node_type = item.data(ROLE_NODE_TYPE)
-            if node_type == 'folder':
+            node = _node(item)
+            if node.kind == 'folder':
                 self.table.setExpanded(index, not self.table.isExpanded(index))
                 return
-            if node_type != 'script':
+            if node.kind != 'script':
                 return
-            sid = item.data(ROLE_NODE_ID)
-            path = item.data(ROLE_PATH)
+            sid, path = node.id, node.path
             self._update_right_pane_visibility(True)
             self.details.set_script(sid, path)
             self.ai_panel.set_script(sid, path)
@@ -566,14 +784,34 @@ class MainWindow(QMainWindow):
             pass
 
     # ----- Context Menu -----
+    def _build_context_menus(self):
+        # Menus and actions are created once and reused for every right-click
+        self._act_new_folder = QAction("新規フォルダ...", self)
+        self._act_rename_folder = QAction("名前変更...", self)
+        self._act_delete_folder = QAction("削除", self)
+        self._act_run = QAction("実行", self)
+        self._act_edit_meta = QAction("メタデータ編集", self)
+        self._act_delete_script = QAction("削除", self)
+        # Blank area and the pseudo root: only allow creating a folder
+        self._menu_blank = QMenu(self)
+        self._menu_blank.addAction(self._act_new_folder)
+        self._menu_folder = QMenu(self)
+        self._menu_folder.addAction(self._act_new_folder)
+        self._menu_folder.addAction(self._act_rename_folder)
+        self._menu_folder.addAction(self._act_delete_folder)
+        self._menu_script = QMenu(self)
+        self._menu_script.addAction(self._act_run)
+        self._menu_script.addAction(self._act_edit_meta)
+        self._menu_script.addAction(self._act_delete_script)
+        self._menu_header = QMenu(self)
+        self._act_fit_columns = QAction("列幅を自動調整", self)
+        self._menu_header.addAction(self._act_fit_columns)
+
     def _context_menu(self, pos):
         idx = self.table.indexAt(pos)
-        menu = QMenu(self)
+        gpos = self.table.viewport().mapToGlobal(pos)
         if not idx.isValid():
-            act_new = QAction("新規フォルダ...", self)
-            menu.addAction(act_new)
-            action = menu.exec(self.table.viewport().mapToGlobal(pos))
-            if action == act_new:
+            if self._menu_blank.exec(gpos) == self._act_new_folder:
                 self._create_folder_dialog(parent_id=None)
             return
         src = self.proxy.mapToSource(idx)
@@ -582,78 +820,43 @@ class MainWindow(QMainWindow):
         item = self.model.itemFromIndex(src0)
         if item is None:
             return
-        node_type = item.data(ROLE_NODE_TYPE)
-        if not node_type:
+        node = _node(item)
+        if not node.kind:
             return
-        if node_type == 'folder':
-            act_new = QAction("新規フォルダ...", self)
-            act_rename = QAction("名前変更...", self)
-            act_delete = QAction("削除", self)
-            fid_raw = item.data(ROLE_NODE_ID)
-            # Root folder (fid_raw is None): only allow creating subfolder
-            if fid_raw is None:
-                menu.addAction(act_new)
-                action = menu.exec(self.table.viewport().mapToGlobal(pos))
-                if action == act_new:
+        if node.kind == 'folder':
+            fid = node.id
+            # Root folder (id is None): only allow creating subfolder
+            if fid is None:
+                if self._menu_blank.exec(gpos) == self._act_new_folder:
                     self._create_folder_dialog(parent_id=None)
             else:
-                menu.addAction(act_new)
-                menu.addAction(act_rename)
-                menu.addAction(act_delete)
-                action = menu.exec(self.table.viewport().mapToGlobal(pos))
-                try:
-                    fid = int(fid_raw)
-                except Exception:
-                    return
-                if action == act_new:
+                action = self._menu_folder.exec(gpos)
+                if action == self._act_new_folder:
                     self._create_folder_dialog(parent_id=fid)
-                elif action == act_rename:
+                elif action == self._act_rename_folder:
                     self._rename_folder_dialog(fid, item.text())
-                elif action == act_delete:
+                elif action == self._act_delete_folder:
                     reply = QMessageBox.question(self, "確認", "フォルダを削除しますか？(配下のフォルダは削除、スクリプトはルートに移動)")
                     if reply == QMessageBox.StandardButton.Yes:
                         folder_delete(fid)
                         self.reload_tree()
         else:
-            act_run = QAction("実行", self)
-            act_edit = QAction("メタデータ編集", self)
-            act_delete = QAction("削除", self)
-            menu.addAction(act_run)
-            menu.addAction(act_edit)
-            menu.addAction(act_delete)
-            action = menu.exec(self.table.viewport().mapToGlobal(pos))
-            if action == act_run:
-                try:
-                    sid = int(item.data(ROLE_NODE_ID))
-                except Exception:
-                    return
-                path = item.data(ROLE_PATH)
-                self._clear_log_for_sid(int(sid))
-                args = self.details.build_args()
-                pyexe = self.details.get_python_executable()
-                wd = self.details.get_working_dir()
-                self.details.save_current_values()
-                self.runner.run(int(sid), path, args=args, python_executable=pyexe, working_dir=wd)
-            elif action == act_edit:
-                try:
-                    sid = int(item.data(ROLE_NODE_ID))
-                except Exception:
-                    return
+            sid, path, tags, desc = node.id, node.path, node.tags, node.desc
+            action = self._menu_script.exec(gpos)
+            if action == self._act_run:
+                self._launch(sid, path)
+            elif action == self._act_edit_meta:
                 name = item.text()
-                tags = item.data(ROLE_TAGS)
-                desc = item.data(ROLE_DESC)
                 dlg = MetaEditDialog(name, tags, desc, self)
                 if dlg.exec() == dlg.DialogCode.Accepted:
                     n, t, d = dlg.values()
                     save_meta(int(sid), n or name, t, d)
-                    self.reload_tree()
-            elif action == act_delete:
-                try:
-                    sid = int(item.data(ROLE_NODE_ID))
-                except Exception:
-                    return
+                    if not self.update_one(sid):
+                        self.reload_tree()
+            elif action == self._act_delete_script:
                 remove(int(sid))
-                self.reload_tree()
+                if not self.remove_one(sid):
+                    self.reload_tree()
 
     def _run_from_details(self):
         # 右ペインに表示中（ダブルクリックで確定）しているスクリプトを使用
@@ -662,12 +865,7 @@ class MainWindow(QMainWindow):
         if sid is None or not path:
             QMessageBox.information(self, "情報", "スクリプトが選択されていません（ダブルクリックで選択）")
             return
-        self._clear_log_for_sid(int(sid))
-        args = self.details.build_args()
-        pyexe = self.details.get_python_executable()
-        wd = self.details.get_working_dir()
-        self.details.save_current_values()
-        self.runner.run(int(sid), path, args=args, python_executable=pyexe, working_dir=wd)
+        self._launch(sid, path)
 
     def _stop_current_run(self):
         sid = getattr(self.details, 'current_sid', None)
@@ -698,81 +896,54 @@ class MainWindow(QMainWindow):
         item = self.model.itemFromIndex(src0)
         if item is None:
             return None
-        if item.data(ROLE_NODE_TYPE) == 'folder':
-            fid_raw = item.data(ROLE_NODE_ID)
-            try:
-                return int(fid_raw) if fid_raw is not None else None
-            except Exception:
-                return None
+        node = _node(item)
+        if node.kind == 'folder':
+            return node.id
         parent = item.parent()
-        if parent is not None and parent.data(ROLE_NODE_TYPE) == 'folder':
-            fid_raw = parent.data(ROLE_NODE_ID)
-            try:
-                return int(fid_raw) if fid_raw is not None else None
-            except Exception:
-                return None
+        if parent is not None:
+            pnode = _node(parent)
+            if pnode.kind == 'folder':
+                return pnode.id
         return None
 
     def _select_tree_script_by_id(self, sid: int):
-        def dfs(parent_index: QModelIndex) -> bool:
-            rows = self.model.rowCount(parent_index)
-            for r in range(rows):
-                idx0 = self.model.index(r, 0, parent_index)
-                item = self.model.itemFromIndex(idx0)
-                if item is None:
-                    continue
-                if item.data(ROLE_NODE_TYPE) == 'script' and int(item.data(ROLE_NODE_ID)) == int(sid):
-                    pidx = self.proxy.mapFromSource(idx0)
-                    if pidx.isValid():
-                        self.table.setCurrentIndex(pidx)
-                        # Expand ancestors
-                        cur = pidx.parent()
-                        while cur.isValid():
-                            self.table.expand(cur)
-                            cur = cur.parent()
-                    return True
-                if self.model.hasChildren(idx0):
-                    if dfs(idx0):
-                        return True
-            return False
-        dfs(QModelIndex())
-
-    def _on_tree_expanded(self, index: QModelIndex):
         try:
-            settings = QSettings("ScriptDeck", "ScriptDeck")
-            self._save_tree_state(settings)
+            items = self._script_items.get(int(sid))
         except Exception:
-            pass
+            return
+        if items is None:
+            return
+        idx0 = self.model.indexFromItem(items[0])
+        pidx = self.proxy.mapFromSource(idx0)
+        if pidx.isValid():
+            self.table.setCurrentIndex(pidx)
+            # Expand ancestors
+            cur = pidx.parent()
+            while cur.isValid():
+                self.table.expand(cur)
+                cur = cur.parent()
+
+    def _on_tree_expanded(self, index: QModelIndex):
+        self._state_timer.start()
 
     def _on_tree_collapsed(self, index: QModelIndex):
+        self._state_timer.start()
+
+    def _flush_view_state(self):
         try:
-            settings = QSettings("ScriptDeck", "ScriptDeck")
-            self._save_tree_state(settings)
+            self._save_tree_state(self._settings)
+            self._save_header_state(self._settings)
         except Exception:
             pass
 
     def _save_tree_state(self, settings: QSettings):
-        expanded_ids: list[int] = []
-        def collect(parent_index: QModelIndex):
-            rows = self.model.rowCount(parent_index)
-            for r in range(rows):
-                idx0 = self.model.index(r, 0, parent_index)
-                item = self.model.itemFromIndex(idx0)
-                if item is None:
-                    continue
-                if item.data(ROLE_NODE_TYPE) == 'folder':
-                    pidx = self.proxy.mapFromSource(idx0)
-                    if self.table.isExpanded(pidx):
-                        expanded_ids.append(int(item.data(ROLE_NODE_ID)))
-                if self.model.hasChildren(idx0):
-                    collect(idx0)
-        collect(QModelIndex())
-        settings.setValue("tree/expanded_folders", expanded_ids)
+        if not self._tree_built:
+            return
+        settings.setValue("tree/expanded_folders", sorted(self._collect_expanded_ids()))
 
     def _restore_tree_state(self):
         try:
-            settings = QSettings("ScriptDeck", "ScriptDeck")
-            vals = settings.value("tree/expanded_folders")
+            vals = self._settings.value("tree/expanded_folders")
             if vals is None:
                 return
             if isinstance(vals, list):
@@ -789,52 +960,26 @@ class MainWindow(QMainWindow):
     def _collect_expanded_ids(self) -> set[int]:
         ids: set[int] = set()
         try:
-            def collect(parent_index: QModelIndex):
-                rows = self.model.rowCount(parent_index)
-                for r in range(rows):
-                    idx0 = self.model.index(r, 0, parent_index)
-                    item = self.model.itemFromIndex(idx0)
-                    if item is None:
-                        continue
-                    if item.data(ROLE_NODE_TYPE) == 'folder':
-                        pidx = self.proxy.mapFromSource(idx0)
-                        if self.table.isExpanded(pidx):
-                            fid = item.data(ROLE_NODE_ID)
-                            if isinstance(fid, int):
-                                ids.add(int(fid))
-                    if self.model.hasChildren(idx0):
-                        collect(idx0)
-            collect(QModelIndex())
+            for fid, item in self._folder_items.items():
+                if self.table.isExpanded(self.proxy.mapFromSource(item.index())):
+                    ids.add(fid)
         except Exception:
             pass
         return ids
 
     def _apply_expanded_ids(self, wanted: set[int]):
         try:
-            def apply(parent_index: QModelIndex):
-                rows = self.model.rowCount(parent_index)
-                for r in range(rows):
-                    idx0 = self.model.index(r, 0, parent_index)
-                    item = self.model.itemFromIndex(idx0)
-                    if item is None:
-                        continue
-                    if item.data(ROLE_NODE_TYPE) == 'folder':
-                        fid = item.data(ROLE_NODE_ID)
-                        if isinstance(fid, int) and int(fid) in wanted:
-                            pidx = self.proxy.mapFromSource(idx0)
-                            self.table.expand(pidx)
-                    if self.model.hasChildren(idx0):
-                        apply(idx0)
-            apply(QModelIndex())
+            for fid in wanted:
+                item = self._folder_items.get(fid)
+                if item is not None:
+                    self.table.expand(self.proxy.mapFromSource(item.index()))
         except Exception:
             pass
 
     def _save_header_state(self, settings: QSettings | None = None):
         try:
             st = self.table.header().saveState()
-            if settings is None:
-                settings = QSettings("ScriptDeck", "ScriptDeck")
-            settings.setValue("tree/header", st)
+            (settings or self._settings).setValue("tree/header", st)
         except Exception:
             pass
 
@@ -859,7 +1004,74 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "エラー", str(e))
 
 
+class _LogBuffer:
+    """Output of one script, trimmed to its last LOG_MAX_BLOCKS lines like the view."""
+
+    __slots__ = ("chunks", "lines")
+
+    def __init__(self):
+        self.chunks: deque[str] = deque()
+        self.lines = 0
+
+    def append(self, s: str):
+        self.chunks.append(s)
+        self.lines += s.count("\n")
+        excess = self.lines - LOG_MAX_BLOCKS
+        while excess > 0:
+            head = self.chunks[0]
+            n = head.count("\n")
+            if n <= excess:
+                self.chunks.popleft()
+                self.lines -= n
+                excess -= n
+                continue
+            # Cut the oldest chunk just after its excess-th line break
+            cut = -1
+            for _ in range(excess):
+                cut = head.index("\n", cut + 1)
+            self.chunks[0] = head[cut + 1:]
+            self.lines -= excess
+            break
+
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+
+class _TreeFetchSignals(QObject):
+    done = pyqtSignal(int, object)
+
+
+class _TreeFetchTask(QRunnable):
+    """Reads the folder/script rows for reload_tree on MainWindow's db pool thread."""
+
+    def __init__(self, gen: int, signals: _TreeFetchSignals):
+        super().__init__()
+        self.gen = gen
+        self.signals = signals
+
+    def run(self):
+        try:
+            all_folders = [tuple(f) for f in folders_all()]
+            # One grouped SELECT instead of a query per folder
+            scripts_by_folder = {
+                fid: [tuple(s) for s in rows]
+                for fid, rows in scripts_all_grouped().items()
+            }
+            data = (all_folders, scripts_by_folder)
+        except Exception:
+            data = None
+        # Queued to the GUI thread, where the QStandardItems are built
+        self.signals.done.emit(self.gen, data)
+
+
 class WrappingItemDelegate(QStyledItemDelegate):
+    HEIGHT_CACHE_SIZE = 4096
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._doc = QTextDocument()
+        self._heights: dict[tuple, int] = {}
+
     def paint(self, painter, option, index):
         opt = QStyleOptionViewItem(option)
         self.initStyleOption(opt, index)
@@ -889,24 +1101,51 @@ class WrappingItemDelegate(QStyledItemDelegate):
                     width = w2 - 8
         except Exception:
             pass
-        doc = QTextDocument()
-        try:
-            doc.setDefaultFont(opt.font)
-        except Exception:
-            pass
-        doc.setPlainText(text)
         if width <= 0:
             return base
-        doc.setTextWidth(width)
-        h = int(doc.size().height()) + 6
+        key = (text, width, opt.font.key())
+        h = self._heights.get(key)
+        if h is None:
+            # One document reused for every measurement; heights are cached per
+            # (text, width, font) so repeated rows skip the layout entirely
+            doc = self._doc
+            try:
+                doc.setDefaultFont(opt.font)
+            except Exception:
+                pass
+            doc.setPlainText(text)
+            doc.setTextWidth(width)
+            h = int(doc.size().height()) + 6
+            if len(self._heights) >= self.HEIGHT_CACHE_SIZE:
+                self._heights.clear()
+            self._heights[key] = h
         return QSize(base.width(), max(base.height(), h))
 
 
 class RunningIndicatorDelegate(QStyledItemDelegate):
+    # Columns whose full text is shown as a tooltip (名前・タグ・説明・パス)
+    TOOLTIP_COLUMNS = (0, 1, 2, 3)
+
     def __init__(self, window, parent=None):
         super().__init__(parent)
         self.window = window
 
+    def helpEvent(self, event, view, option, index):
+        # Tooltips are built on hover instead of being stored on every item
+        if event.type() != QEvent.Type.ToolTip or not index.isValid():
+            return super().helpEvent(event, view, option, index)
+        text = ""
+        if index.column() in self.TOOLTIP_COLUMNS:
+            text = str(index.data() or "")
+            if text and index.column() == 2:
+                # Show multi-line wrapped description
+                text = _wrap_tooltip_text(text)
+        if text:
+            QToolTip.showText(event.globalPos(), text, view)
+        else:
+            QToolTip.hideText()
+        return True
+
     def paint(self, painter, option, index):
         opt = QStyleOptionViewItem(option)
         self.initStyleOption(opt, index)
@@ -916,14 +1155,10 @@ class RunningIndicatorDelegate(QStyledItemDelegate):
         # Only decorate script items in column 0
         if index.column() != 0:
             return
-        try:
-            ntype = index.data(ROLE_NODE_TYPE)
-            if ntype != 'script':
-                return
-            sid_raw = index.data(ROLE_NODE_ID)
-            sid = int(sid_raw)
-        except Exception:
+        node = _node(index)
+        if node.kind != 'script':
             return
+        sid = node.id
         try:
             if not hasattr(self.window, 'is_script_running') or not self.window.is_script_running(sid):
                 return
@@ -955,25 +1190,34 @@ class RunningIndicatorDelegate(QStyledItemDelegate):
             painter.restore()
 
 class RecursiveFilterProxyModel(QSortFilterProxyModel):
+    """Filters on the needle given to set_needle; Qt's own filter string, key
+    column and case sensitivity settings are not used."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._needle = ""
+
+    def set_needle(self, text: str):
+        needle = (text or "").casefold()
+        if needle == self._needle:
+            return
+        self._needle = needle
+        self.invalidateFilter()
+
+    def refilter(self):
+        """Re-apply the active search after row texts changed in place."""
+        if self._needle:
+            self.invalidateFilter()
+
+    def matches(self, search_text: str) -> bool:
+        """Whether a row with this ROLE_SEARCH text passes the active search."""
+        return self._needle in search_text
+
     def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if not self._needle:
+            return True
         idx0 = self.sourceModel().index(source_row, 0, source_parent)
-        if idx0.isValid():
-            text = []
-            cols = self.sourceModel().columnCount(idx0)
-            for c in range(cols):
-                idx = self.sourceModel().index(source_row, c, source_parent)
-                if idx.isValid():
-                    val = str(self.sourceModel().data(idx) or "")
-                    if val:
-                        text.append(val)
-            combined = " \t".join(text)
-            if self.filterRegularExpression().match(combined).hasMatch():
-                return True
-        child_count = self.sourceModel().rowCount(idx0)
-        for r in range(child_count):
-            if self.filterAcceptsRow(r, idx0):
-                return True
-        return False
+        return idx0.isValid() and self.matches(idx0.data(ROLE_SEARCH) or "")
 
 
 class ScriptTreeView(QTreeView):
@@ -999,100 +1243,60 @@ class ScriptTreeView(QTreeView):
             src0 = window.model.index(src.row(), 0, src.parent())
             target_item = window.model.itemFromIndex(src0)
             if target_item is not None:
-                if target_item.data(ROLE_NODE_TYPE) == 'folder':
-                    folder_id = target_item.data(ROLE_NODE_ID)  # may be None for root
-                elif target_item.data(ROLE_NODE_TYPE) == 'script':
+                tnode = _node(target_item)
+                if tnode.kind == 'folder':
+                    folder_id = tnode.id  # may be None for root
+                elif tnode.kind == 'script':
                     # Use parent folder of the target script
                     parent = target_item.parent()
-                    if parent is not None and parent.data(ROLE_NODE_TYPE) == 'folder':
-                        folder_id = parent.data(ROLE_NODE_ID)  # may be None
-        sel = self.selectionModel().selectedIndexes()
-        moved_any = False
+                    if parent is not None and _node(parent).kind == 'folder':
+                        folder_id = _node(parent).id  # may be None
+        # The destination folder and its ancestors, collected once per drop:
+        # moving any of them there would put a folder inside its own subtree,
+        # so each dragged folder then costs one set lookup
+        blocked: set[int] = set()
+        cur = folder_id
+        while cur is not None and cur not in blocked:
+            blocked.add(cur)
+            cur = window._folder_parent.get(cur)
+
+        # One column-0 index per selected row; node type/id are read straight
+        # through the proxy
+        sel = self.selectionModel().selectedRows(0)
+        moved: list[tuple[str, int]] = []
         handled = False
-        for idx in sel:
-            if idx.column() != 0:
-                continue
-            sidx = window.proxy.mapToSource(idx)
-            it = window.model.itemFromIndex(sidx)
-            if it is None:
-                continue
-            ntype = it.data(ROLE_NODE_TYPE)
-            if ntype == 'script':
-                sid = int(it.data(ROLE_NODE_ID))
-                assign_script_to_folder(sid, folder_id)
-                moved_any = True
-                handled = True
-            elif ntype == 'folder':
-                fid = int(it.data(ROLE_NODE_ID))
-                # Prevent moving a folder into itself or its descendants
-                invalid_target = False
-                if target_item is not None:
-                    if target_item.data(ROLE_NODE_TYPE) == 'folder':
-                        tfid_raw = target_item.data(ROLE_NODE_ID)
-                        if tfid_raw is not None:
-                            try:
-                                tfid = int(tfid_raw)
-                            except Exception:
-                                tfid = None
-                            if tfid is not None:
-                                if tfid == fid:
-                                    invalid_target = True
-                                else:
-                                    # Check descendant: DFS from current folder item
-                                    def is_descendant(curr_item):
-                                        rows = curr_item.rowCount()
-                                        for r in range(rows):
-                                            child = curr_item.child(r, 0)
-                                            if child is None:
-                                                continue
-                                            if child.data(ROLE_NODE_TYPE) == 'folder':
-                                                try:
-                                                    cid_raw = child.data(ROLE_NODE_ID)
-                                                    cid = int(cid_raw) if cid_raw is not None else None
-                                                except Exception:
-                                                    cid = None
-                                                if cid is not None and cid == tfid:
-                                                    return True
-                                                if is_descendant(child):
-                                                    return True
-                                        return False
-                                    if is_descendant(it):
-                                        invalid_target = True
-                if not invalid_target:
-                    try:
-                        folder_move(fid, folder_id)
-                        moved_any = True
+        # Apply all moves of this drop in a single DB transaction
+        with batch():
+            for idx in sel:
+                node = _node(idx)
+                if node.id is None:
+                    # The <root> pseudo folder itself can't be moved
+                    continue
+                if node.kind == 'script':
+                    # Already in the destination: nothing to write or move
+                    if _node(idx.parent()).id != folder_id:
+                        assign_script_to_folder(node.id, folder_id)
+                        moved.append(('script', node.id))
+                    handled = True
+                elif node.kind == 'folder':
+                    fid = node.id
+                    if window._folder_parent.get(fid) == folder_id:
                         handled = True
-                    except Exception:
-                        pass
-        if moved_any:
+                    elif fid not in blocked:
+                        try:
+                            folder_move(fid, folder_id)
+                            moved.append(('folder', fid))
+                            handled = True
+                        except Exception:
+                            pass
+        # Committed: move the rows in place; rebuild only if that isn't possible
+        if moved and not window.move_rows(moved, folder_id):
             window.reload_tree()
         if handled:
             event.acceptProposedAction()
         else:
             event.ignore()
 
-    # ----- Utils -----
-    def _wrap_tooltip_text(self, text: str, width: int = 60) -> str:
-        if not text:
-            return ""
-        try:
-            w = int(width) if width and int(width) > 0 else 60
-        except Exception:
-            w = 60
-        lines = []
-        for para in str(text).splitlines() or [""]:
-            s = para
-            while len(s) > w:
-                # break at last space before limit if possible
-                cut = s.rfind(" ", 0, w)
-                if cut <= 0:
-                    cut = w
-                lines.append(s[:cut])
-                s = s[cut:].lstrip()
-            lines.append(s)
-        return "\n".join(lines)
-
 def main():
     app = QApplication(sys.argv)
     w = MainWindow()
@@ -1,20 +1,33 @@
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Tuple
+import itertools
 import os
+import sqlite3
 from db import (
-    upsert_script, list_scripts, update_meta, delete_script,
-    list_all_folders, list_folders, create_folder, rename_folder, delete_folder,
-    move_folder, assign_script_folder, list_scripts_in_folder,
+    upsert_script, upsert_scripts_bulk, list_scripts, get_script, update_meta, delete_script,
+    list_all_folders, create_folder, rename_folder, delete_folder,
+    move_folder, assign_script_folder, list_scripts_in_folder, list_scripts_by_folder, maintenance,
+    batch, commit_generation,
 )
 
-PY_EXTS = {".py"}
+# Suffixes accepted as scripts; a tuple so it can go straight to str.endswith
+PY_EXTS = (".py",)
+
+# Errors that reject a single imported row; anything else (locked db, schema) is real
+_ROW_REJECTED = (sqlite3.IntegrityError, UnicodeEncodeError)
 
 def import_file(path: Path, name: Optional[str] = None, tags: str = "", description: str = "", folder_id: Optional[int] = None) -> int:
-    path = path.expanduser().resolve()
-    if not path.exists() or path.suffix.lower() not in PY_EXTS:
+    spath = os.fspath(path)
+    if spath.startswith("~"):
+        spath = os.path.expanduser(spath)
+    # Resolved even when absolute: path is the upsert key, so a symlinked or
+    # differently spelled path to the same file must not become a second row
+    spath = os.path.realpath(spath)
+    # Cheap string check first; only accepted names pay for the stat
+    if not spath.lower().endswith(PY_EXTS) or not os.path.exists(spath):
         raise ValueError("Pythonスクリプト(.py)のみ対応です")
     # Default to filename WITH extension (e.g., my_script.py)
-    sid = upsert_script(name or path.name, str(path), tags, description)
+    sid = upsert_script(name or os.path.basename(spath), spath, tags, description)
     if folder_id is not None:
         try:
             assign_script_folder(sid, int(folder_id))
@@ -22,32 +35,56 @@ def import_file(path: Path, name: Optional[str] = None, tags: str = "", descript
             pass
     return sid
 
+def _iter_py_files(root: str, recurse: bool) -> Iterator[Tuple[str, str]]:
+    """Yield (file name, path) of .py files under root using scandir's cached entry types."""
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            # Unreadable directory: skip it like glob does
+            continue
+        with it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        if recurse:
+                            stack.append(e.path)
+                    elif e.name.lower().endswith(PY_EXTS) and e.is_file():
+                        yield e.name, e.path
+                except OSError:
+                    pass
+
 def import_directory(dir_path: Path, recurse: bool = True, folder_id: Optional[int] = None) -> int:
     dir_path = dir_path.expanduser().resolve()
     if not dir_path.is_dir():
         raise ValueError("ディレクトリを指定してください")
-    count = 0
-    walker = dir_path.rglob("*.py") if recurse else dir_path.glob("*.py")
-    for p in walker:
+    fid = int(folder_id) if folder_id is not None else None
+    # Store filename with extension for clarity in the list view
+    rows = [(name, path, "", "", fid) for name, path in _iter_py_files(str(dir_path), recurse)]
+    # Single transaction for the whole import instead of one commit per file
+    with batch():
         try:
-            # Store filename with extension for clarity in the list view
-            sid = upsert_script(p.name, str(p), "", "")
-            if folder_id is not None:
-                try:
-                    assign_script_folder(sid, int(folder_id))
-                except Exception:
-                    pass
-            count += 1
-        except Exception:
+            upsert_scripts_bulk(rows)
+            return len(rows)
+        except _ROW_REJECTED:
             pass
-    return count
+        # Some row was rejected (e.g. an unencodable file name): retry one by one
+        count = 0
+        for row in rows:
+            try:
+                upsert_scripts_bulk((row,))
+                count += 1
+            except _ROW_REJECTED:
+                pass
+        return count
 
 def fetch_all() -> List[Dict[str, Any]]:
-    rows = list_scripts()
-    return [
-        dict(id=r[0], name=r[1], path=r[2], tags=r[3], description=r[4], last_run=r[5], run_count=r[6], folder_id=r[7])
-        for r in rows
-    ]
+    # Rows are sqlite3.Row (keyed by column name), so dict() maps them directly
+    return [dict(r) for r in list_scripts()]
+
+def fetch_one(sid: int):
+    return get_script(sid)
 
 def save_meta(sid: int, name: str, tags: str, description: str):
     update_meta(sid, name, tags, description)
@@ -56,11 +93,32 @@ def remove(sid: int):
     delete_script(sid)
 
 # ----- Folder APIs (re-export db functions) -----
+# (commit generation, all folder rows, parent_id -> child rows) of the last read.
+# Tied to the db commit counter rather than to the folder_* wrappers so writes
+# made inside a batch() only invalidate it once they are actually visible.
+_folders_cache: Optional[tuple] = None
+
+def _folder_snapshot() -> tuple:
+    global _folders_cache
+    cached = _folders_cache
+    gen = commit_generation()
+    if cached is not None and cached[0] == gen:
+        return cached
+    rows = list_all_folders()
+    children: Dict[Optional[int], list] = {}
+    for r in rows:
+        children.setdefault(r["parent_id"], []).append(r)
+    # Stored under the generation seen *before* the query: a commit racing
+    # with it makes the entry stale immediately instead of hiding the change
+    snap = (gen, rows, children)
+    _folders_cache = snap
+    return snap
+
 def folders_all():
-    return list_all_folders()
+    return _folder_snapshot()[1]
 
 def folders(parent_id: Optional[int] = None):
-    return list_folders(parent_id)
+    return _folder_snapshot()[2].get(parent_id, [])
 
 def folder_create(name: str, parent_id: Optional[int] = None) -> int:
     return create_folder(name, parent_id)
@@ -79,3 +137,13 @@ def assign_script_to_folder(script_id: int, folder_id: Optional[int]):
 
 def scripts_in_folder(folder_id: Optional[int]):
     return list_scripts_in_folder(folder_id)
+
+def scripts_all_grouped() -> Dict[Optional[int], list]:
+    """All scripts in one query, grouped by folder_id (None = root); each group sorted by name."""
+    return {
+        fid: list(rows)
+        for fid, rows in itertools.groupby(list_scripts_by_folder(), key=lambda r: r["folder_id"])
+    }
+
+def db_maintenance():
+    maintenance()
@@ -1,12 +1,189 @@
 import sys
 import os
+import codecs
+import functools
+import shlex
 import subprocess
 import signal
 import platform
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from pathlib import Path
-from PyQt6.QtCore import QObject, pyqtSignal, QProcess, QProcessEnvironment
-from db import bump_run
+from PyQt6.QtCore import QObject, pyqtSignal, QProcess, QProcessEnvironment, QTimer
+from db import record_run
+
+# Output read from the processes is buffered and emitted at most this often
+OUTPUT_COALESCE_MS = 40
+
+# Interpreter used when a script has no venv assigned
+_DEFAULT_PYTHON = sys.executable
+
+_utf8_decoder = codecs.getincrementaldecoder("utf-8")
+
+
+def _new_decoder() -> codecs.IncrementalDecoder:
+    return _utf8_decoder(errors="ignore")
+
+
+# ----- Windows Job Objects (kill a process tree without spawning taskkill) -----
+_PROCESS_TERMINATE = 0x0001
+_PROCESS_SET_QUOTA = 0x0100
+_THREAD_SUSPEND_RESUME = 0x0002
+_TH32CS_SNAPTHREAD = 0x00000004
+_CREATE_SUSPENDED = 0x00000004
+_JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE = 0x00002000
+_JobObjectExtendedLimitInformation = 9
+
+@functools.lru_cache(maxsize=None)
+def _kernel32():
+    import ctypes
+    from ctypes import wintypes
+    k32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    k32.CreateJobObjectW.restype = wintypes.HANDLE
+    k32.CreateJobObjectW.argtypes = (wintypes.LPVOID, wintypes.LPCWSTR)
+    k32.OpenProcess.restype = wintypes.HANDLE
+    k32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    k32.AssignProcessToJobObject.restype = wintypes.BOOL
+    k32.AssignProcessToJobObject.argtypes = (wintypes.HANDLE, wintypes.HANDLE)
+    k32.TerminateJobObject.restype = wintypes.BOOL
+    k32.TerminateJobObject.argtypes = (wintypes.HANDLE, wintypes.UINT)
+    k32.CloseHandle.restype = wintypes.BOOL
+    k32.CloseHandle.argtypes = (wintypes.HANDLE,)
+    k32.SetInformationJobObject.restype = wintypes.BOOL
+    k32.SetInformationJobObject.argtypes = (wintypes.HANDLE, ctypes.c_int, wintypes.LPVOID, wintypes.DWORD)
+    k32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+    k32.CreateToolhelp32Snapshot.argtypes = (wintypes.DWORD, wintypes.DWORD)
+    k32.Thread32First.restype = wintypes.BOOL
+    k32.Thread32First.argtypes = (wintypes.HANDLE, wintypes.LPVOID)
+    k32.Thread32Next.restype = wintypes.BOOL
+    k32.Thread32Next.argtypes = (wintypes.HANDLE, wintypes.LPVOID)
+    k32.OpenThread.restype = wintypes.HANDLE
+    k32.OpenThread.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    k32.ResumeThread.restype = wintypes.DWORD
+    k32.ResumeThread.argtypes = (wintypes.HANDLE,)
+    return k32
+
+def _win_kill_on_close(job: int) -> bool:
+    """Make closing the job handle end every process still in it."""
+    import ctypes
+    from ctypes import wintypes
+
+    class _IoCounters(ctypes.Structure):
+        _fields_ = [(name, ctypes.c_ulonglong) for name in (
+            "ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+            "ReadTransferCount", "WriteTransferCount", "OtherTransferCount")]
+
+    class _BasicLimits(ctypes.Structure):
+        _fields_ = [
+            ("PerProcessUserTimeLimit", ctypes.c_longlong),
+            ("PerJobUserTimeLimit", ctypes.c_longlong),
+            ("LimitFlags", wintypes.DWORD),
+            ("MinimumWorkingSetSize", ctypes.c_size_t),
+            ("MaximumWorkingSetSize", ctypes.c_size_t),
+            ("ActiveProcessLimit", wintypes.DWORD),
+            ("Affinity", ctypes.c_size_t),
+            ("PriorityClass", wintypes.DWORD),
+            ("SchedulingClass", wintypes.DWORD),
+        ]
+
+    class _ExtendedLimits(ctypes.Structure):
+        _fields_ = [
+            ("BasicLimitInformation", _BasicLimits),
+            ("IoInfo", _IoCounters),
+            ("ProcessMemoryLimit", ctypes.c_size_t),
+            ("JobMemoryLimit", ctypes.c_size_t),
+            ("PeakProcessMemoryUsed", ctypes.c_size_t),
+            ("PeakJobMemoryUsed", ctypes.c_size_t),
+        ]
+
+    info = _ExtendedLimits()
+    info.BasicLimitInformation.LimitFlags = _JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE
+    return bool(_kernel32().SetInformationJobObject(
+        job, _JobObjectExtendedLimitInformation, ctypes.byref(info), ctypes.sizeof(info)))
+
+def _win_resume_threads(pid: int):
+    """Resume the threads of a process created with CREATE_SUSPENDED."""
+    import ctypes
+    from ctypes import wintypes
+
+    class _ThreadEntry(ctypes.Structure):
+        _fields_ = [
+            ("dwSize", wintypes.DWORD),
+            ("cntUsage", wintypes.DWORD),
+            ("th32ThreadID", wintypes.DWORD),
+            ("th32OwnerProcessID", wintypes.DWORD),
+            ("tpBasePri", wintypes.LONG),
+            ("tpDeltaPri", wintypes.LONG),
+            ("dwFlags", wintypes.DWORD),
+        ]
+
+    k32 = _kernel32()
+    snap = k32.CreateToolhelp32Snapshot(_TH32CS_SNAPTHREAD, 0)
+    if not snap or snap == wintypes.HANDLE(-1).value:
+        return
+    try:
+        entry = _ThreadEntry()
+        entry.dwSize = ctypes.sizeof(entry)
+        more = k32.Thread32First(snap, ctypes.byref(entry))
+        while more:
+            if entry.th32OwnerProcessID == pid:
+                hthread = k32.OpenThread(_THREAD_SUSPEND_RESUME, False, entry.th32ThreadID)
+                if hthread:
+                    try:
+                        k32.ResumeThread(hthread)
+                    finally:
+                        k32.CloseHandle(hthread)
+            more = k32.Thread32Next(snap, ctypes.byref(entry))
+    finally:
+        k32.CloseHandle(snap)
+
+def _win_job_for(pid: int) -> int | None:
+    """Put pid in a new Job Object; processes it spawns afterwards join the job too."""
+    try:
+        k32 = _kernel32()
+        job = k32.CreateJobObjectW(None, None)
+        if not job:
+            return None
+        _win_kill_on_close(job)
+        hproc = k32.OpenProcess(_PROCESS_SET_QUOTA | _PROCESS_TERMINATE, False, int(pid))
+        ok = False
+        if hproc:
+            try:
+                ok = bool(k32.AssignProcessToJobObject(job, hproc))
+            finally:
+                k32.CloseHandle(hproc)
+        if not ok:
+            k32.CloseHandle(job)
+            return None
+        return job
+    except Exception:
+        return None
+
+def _win_kill_job(job: int) -> bool:
+    try:
+        return bool(_kernel32().TerminateJobObject(job, 1))
+    except Exception:
+        return False
+
+def _win_close_job(job: int):
+    try:
+        _kernel32().CloseHandle(job)
+    except Exception:
+        pass
+
+
+@dataclass(slots=True)
+class RunEntry:
+    """Per-process state: output read but not yet emitted, and its decoders.
+
+    Incremental UTF-8 decoders keep multibyte characters split across reads intact.
+    """
+    proc: QProcess
+    sid: int
+    out_buf: bytearray = field(default_factory=bytearray)
+    err_buf: bytearray = field(default_factory=bytearray)
+    out_dec: codecs.IncrementalDecoder = field(default_factory=_new_decoder)
+    err_dec: codecs.IncrementalDecoder = field(default_factory=_new_decoder)
+    job: int | None = None   # Windows Job Object handle holding the process tree
 
 
 class ScriptRunner(QObject):
@@ -19,9 +196,12 @@ class ScriptRunner(QObject):
         super().__init__(parent)
         # Support multiple concurrent processes
         self._next_run_id: int = 1
-        self._procs: dict[int, QProcess] = {}
-        self._sid_by_run: dict[int, int] = {}
+        self._runs: dict[int, RunEntry] = {}
         self._runs_by_sid: dict[int, set[int]] = {}
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(OUTPUT_COALESCE_MS)
+        self._flush_timer.timeout.connect(self._flush_output)
 
     def run(self, sid: int, script_path: str, args: list[str] | None = None, python_executable: str | None = None, working_dir: str | None = None):
         args = args or []
@@ -33,54 +213,84 @@ class ScriptRunner(QObject):
             proc.setProcessEnvironment(env)
         except Exception:
             pass
-        prog = python_executable or sys.executable
+        prog = python_executable or _DEFAULT_PYTHON
         proc.setProgram(prog)
         # Force unbuffered mode (-u) so stdout/stderr flush immediately
         py_args = ["-u", script_path, *args]
         proc.setArguments(py_args)
-        wd = working_dir or str(Path(script_path).parent)
+        # dirname is a pure string split (no Path object per launch)
+        wd = working_dir or os.path.dirname(script_path) or "."
         proc.setWorkingDirectory(wd)
 
         run_id = self._next_run_id
         self._next_run_id += 1
-        self._procs[run_id] = proc
-        self._sid_by_run[run_id] = int(sid)
+        self._runs[run_id] = RunEntry(proc, int(sid))
         self._runs_by_sid.setdefault(int(sid), set()).add(run_id)
 
-        # Wire signals, binding sid/run_id/proc at connect-time
-        proc.readyReadStandardOutput.connect(
-            lambda sid=sid, p=proc: self.stdout.emit(int(sid), bytes(p.readAllStandardOutput()).decode("utf-8", errors="ignore"))
-        )
-        proc.readyReadStandardError.connect(
-            lambda sid=sid, p=proc: self.stderr.emit(int(sid), bytes(p.readAllStandardError()).decode("utf-8", errors="ignore"))
-        )
-        proc.finished.connect(lambda exitCode, status, run_id=run_id: self._on_finished(run_id, exitCode, status))
-
-        cmdline = f"{prog} -u {script_path} " + " ".join(args)
-        if wd:
-            cmdline += f" (cwd={wd})"
-        self.started.emit(int(sid), cmdline)
+        # Wire signals, binding run_id at connect-time; reads only fill the
+        # buffers, which _flush_output emits once per OUTPUT_COALESCE_MS
+        proc.readyReadStandardOutput.connect(functools.partial(self._read_stdout, run_id))
+        proc.readyReadStandardError.connect(functools.partial(self._read_stderr, run_id))
+        # finished(exitCode, exitStatus) is appended after run_id
+        proc.finished.connect(functools.partial(self._on_finished, run_id))
+
+        # The display string is only built when someone listens for it
+        if self.receivers(self.started) > 0:
+            cmdline = f"{prog} -u {script_path}"
+            if args:
+                # Quoted so arguments containing spaces read back unambiguously
+                cmdline += " " + shlex.join(args)
+            if wd:
+                cmdline += f" (cwd={wd})"
+            self.started.emit(int(sid), cmdline)
+        suspended = False
+        if sys.platform.startswith("win"):
+            # Start the child suspended so it joins the job before it can spawn
+            # anything; without the modifier it joins right after CreateProcess
+            set_modifier = getattr(proc, "setCreateProcessArgumentsModifier", None)
+            if set_modifier is not None:
+                def _suspend(cpargs):
+                    cpargs.flags |= _CREATE_SUSPENDED
+                try:
+                    set_modifier(_suspend)
+                    suspended = True
+                except Exception:
+                    pass
         proc.start()
+        if sys.platform.startswith("win"):
+            # The job lets kill_run end the whole tree, and closing it ends stragglers
+            try:
+                pid = int(proc.processId())
+            except Exception:
+                pid = 0
+            if pid:
+                self._runs[run_id].job = _win_job_for(pid)
+                if suspended:
+                    _win_resume_threads(pid)
 
     # ----- Stop/terminate -----
     def kill_sid(self, sid: int):
-        for run_id in list(self._runs_by_sid.get(int(sid), set())):
+        for run_id in list(self._runs_by_sid.get(int(sid), ())):
             self.kill_run(run_id)
 
     def terminate_sid(self, sid: int):
-        for run_id in list(self._runs_by_sid.get(int(sid), set())):
+        for run_id in list(self._runs_by_sid.get(int(sid), ())):
             self.terminate_run(run_id)
 
     def kill_run(self, run_id: int):
-        proc = self._procs.get(int(run_id))
-        if not proc:
+        entry = self._runs.get(int(run_id))
+        if entry is None:
             return
+        proc = entry.proc
         try:
             pid = int(proc.processId()) if hasattr(proc, 'processId') else None
         except Exception:
             pid = None
         if sys.platform.startswith("win") and pid:
-            # Kill entire process tree on Windows to avoid orphaned servers
+            # Kill entire process tree on Windows to avoid orphaned servers;
+            # the job does it in-process, taskkill is the fallback
+            if entry.job and _win_kill_job(entry.job):
+                return
             try:
                 # /T: kill child processes, /F: force
                 subprocess.run(["taskkill", "/PID", str(pid), "/T", "/F"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, creationflags=0)
@@ -100,14 +310,18 @@ class ScriptRunner(QObject):
                 pass
 
     def terminate_run(self, run_id: int):
-        proc = self._procs.get(int(run_id))
-        if not proc:
+        entry = self._runs.get(int(run_id))
+        if entry is None:
             return
+        proc = entry.proc
         try:
             pid = int(proc.processId()) if hasattr(proc, 'processId') else None
         except Exception:
             pid = None
         if sys.platform.startswith("win") and pid:
+            # Same as kill_run: the job ends the tree in-process, taskkill is the fallback
+            if entry.job and _win_kill_job(entry.job):
+                return
             try:
                 subprocess.run(["taskkill", "/PID", str(pid), "/T"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, creationflags=0)
             except Exception:
@@ -125,23 +339,70 @@ class ScriptRunner(QObject):
                 pass
 
     def kill_all(self):
-        for run_id in list(self._procs.keys()):
+        for run_id in list(self._runs.keys()):
             self.kill_run(run_id)
 
     # ----- Internals -----
+    def _read_stdout(self, run_id: int):
+        entry = self._runs.get(run_id)
+        if entry is None:
+            return
+        # QByteArray exposes the buffer protocol, so extend() copies it once,
+        # straight into the bytearray (`+=` would dispatch to QByteArray.__radd__)
+        entry.out_buf.extend(entry.proc.readAllStandardOutput())
+        self._schedule_flush()
+
+    def _read_stderr(self, run_id: int):
+        entry = self._runs.get(run_id)
+        if entry is None:
+            return
+        entry.err_buf.extend(entry.proc.readAllStandardError())
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def _flush_output(self):
+        for entry in list(self._runs.values()):
+            self._flush_run(entry)
+
+    def _flush_run(self, entry: RunEntry, final: bool = False):
+        for buf, dec, signal_ in (
+            (entry.out_buf, entry.out_dec, self.stdout),
+            (entry.err_buf, entry.err_dec, self.stderr),
+        ):
+            if not (buf or final):
+                continue
+            # A trailing partial character stays in the decoder until the next flush
+            text = dec.decode(buf, final)
+            buf.clear()
+            if text:
+                signal_.emit(entry.sid, text)
+
     def _on_finished(self, run_id: int, exitCode: int, _status):
-        sid = int(self._sid_by_run.get(int(run_id), -1))
+        entry = self._runs.pop(int(run_id), None)
+        if entry is None:
+            return
+        sid = entry.sid
+        # Emit whatever is still buffered (or unread) before the finish notice
+        try:
+            entry.out_buf.extend(entry.proc.readAllStandardOutput())
+            entry.err_buf.extend(entry.proc.readAllStandardError())
+        except Exception:
+            pass
+        self._flush_run(entry, final=True)
         try:
-            bump_run(sid, datetime.now(timezone.utc).isoformat())
+            record_run(sid, datetime.now(timezone.utc).isoformat())
         except Exception:
             pass
         self.finished.emit(sid, exitCode)
         # Cleanup
-        proc = self._procs.pop(int(run_id), None)
-        if proc is not None:
-            proc.deleteLater()
-        if sid in self._runs_by_sid:
-            self._runs_by_sid[sid].discard(int(run_id))
-            if not self._runs_by_sid[sid]:
+        entry.proc.deleteLater()
+        if entry.job:
+            _win_close_job(entry.job)
+        runs = self._runs_by_sid.get(sid)
+        if runs is not None:
+            runs.discard(int(run_id))
+            if not runs:
                 self._runs_by_sid.pop(sid, None)
-        self._sid_by_run.pop(int(run_id), None)
@@ -2,9 +2,12 @@ from PyQt6.QtWidgets import (
     QDialog, QFormLayout, QLineEdit, QTextEdit, QDialogButtonBox,
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton,
     QScrollArea, QFileDialog, QTableWidget, QTableWidgetItem, QMessageBox,
-    QRadioButton, QCompleter, QSplitter, QPlainTextEdit
+    QRadioButton, QCompleter, QSplitter, QPlainTextEdit, QTableView, QAbstractItemView
+)
+from PyQt6.QtCore import (
+    Qt, QProcess, QTimer, QRunnable, QThreadPool, pyqtSignal, QStringListModel, QEvent, QObject, QThread, QSettings, QRect,
+    QAbstractTableModel, QModelIndex
 )
-from PyQt6.QtCore import Qt, QProcess, QTimer, pyqtSignal, QStringListModel, QEvent, QObject, QThread, QSettings, QRect
 from PyQt6.QtGui import QShortcut, QKeySequence, QFont, QPainter
 import sys
 import os
@@ -13,12 +16,34 @@ import json
 import re
 import ast
 from db import (
-    list_venvs, upsert_venv, delete_venv, get_script_extras, update_args_schema,
+    list_venvs, upsert_venv, delete_venv, get_script_extras, ScriptExtras, update_args_schema,
     update_args_values, set_script_venv, get_venv, set_working_dir,
-    list_option_history, upsert_option_history, delete_option_history,
-    add_ai_history, list_ai_history
+    list_option_history, upsert_option_history, upsert_option_history_bulk, delete_option_history,
+    add_ai_history, list_ai_history, batch, commit_generation
 )
 
+# --help parsing. An entry line is "SPEC  description": the spec runs up to the
+# first run of 2+ spaces (and may itself hold single spaces, "-o OUT, --out OUT")
+_HELP_ENTRY_RE = re.compile(r"\s*(\S+(?: \S+)*)(?:\s{2,}(.*\S))?\s*$")
+# One "-o OUT" / "--out OUT" / "--out=OUT" name in a spec: (name, "=", metavar)
+_HELP_OPT_NAME_RE = re.compile(r"(?:^|,)\s*(--?[^\s,=]+)(=?)\s*([^\s,]*)")
+_HELP_DEFAULT_RE = re.compile(r"[\[(]\s*default\s*[:=]\s*([^)\]]+)", re.IGNORECASE)
+_HELP_DEFAULTS_TO_RE = re.compile(r"defaults?\s+to\s+([^.;,\]]+)", re.IGNORECASE)
+
+
+# venv rows as tuples, shared by the env combo and the manager dialog, with the
+# db commit generation they were read at; any committed write invalidates them
+_VENV_CACHE: tuple[int, list[tuple]] | None = None
+
+
+def cached_list_venvs() -> list[tuple]:
+    global _VENV_CACHE
+    gen = commit_generation()
+    if _VENV_CACHE is None or _VENV_CACHE[0] != gen:
+        _VENV_CACHE = (gen, [tuple(r) for r in list_venvs()])
+    return _VENV_CACHE[1]
+
+
 # Module-level helper to get OpenAI API key
 def get_openai_api_key() -> str | None:
     key = os.environ.get("OPENAI_API_KEY")
@@ -602,14 +627,52 @@ class MetaEditDialog(QDialog):
         return self.name_edit.text().strip(), self.tags_edit.text().strip(), self.desc_edit.toPlainText().strip()
 
 
+class _VenvTableModel(QAbstractTableModel):
+    """Read-only view over list_venvs() rows: (id, name, path, python, ...)."""
+    HEADERS = ("名前", "パス", "Python")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: list[tuple] = []
+
+    def set_rows(self, rows: list[tuple]):
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+
+    def venv_id(self, row: int) -> int | None:
+        if 0 <= row < len(self._rows):
+            return self._rows[row][0]
+        return None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and index.isValid():
+            return self._rows[index.row()][index.column() + 1]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+
 class VenvManagerDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Python環境の管理")
         layout = QVBoxLayout(self)
 
-        self.table = QTableWidget(0, 3, self)
-        self.table.setHorizontalHeaderLabels(["名前", "パス", "Python"])
+        # Plain view over a model: a refresh is one model reset, no per-cell items
+        self._model = _VenvTableModel(self)
+        self.table = QTableView(self)
+        self.table.setModel(self._model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.table.horizontalHeader().setStretchLastSection(True)
         layout.addWidget(self.table, 1)
 
@@ -627,19 +690,10 @@ class VenvManagerDialog(QDialog):
         self.btn_remove.clicked.connect(self._on_remove)
         self.btn_close.clicked.connect(self.accept)
 
-        self._id_by_row = {}
         self.refresh()
 
     def refresh(self):
-        self.table.setRowCount(0)
-        self._id_by_row.clear()
-        for row in list_venvs():
-            ridx = self.table.rowCount()
-            self.table.insertRow(ridx)
-            self.table.setItem(ridx, 0, QTableWidgetItem(row[1]))
-            self.table.setItem(ridx, 1, QTableWidgetItem(row[2]))
-            self.table.setItem(ridx, 2, QTableWidgetItem(row[3]))
-            self._id_by_row[ridx] = row[0]
+        self._model.set_rows(cached_list_venvs())
 
     def _on_add(self):
         folder = QFileDialog.getExistingDirectory(self, "venvフォルダを選択")
@@ -663,10 +717,10 @@ class VenvManagerDialog(QDialog):
             self.refresh()
 
     def _on_remove(self):
-        row = self.table.currentRow()
+        row = self.table.currentIndex().row()
         if row < 0:
             return
-        vid = self._id_by_row.get(row)
+        vid = self._model.venv_id(row)
         if not vid:
             return
         ret = QMessageBox.question(self, "確認", "選択した環境を削除しますか？")
@@ -676,6 +730,37 @@ class VenvManagerDialog(QDialog):
         self.refresh()
 
 
+class _HelpParseSignals(QObject):
+    done = pyqtSignal(int, int, object)  # probe gen, sid, schema
+
+
+class _HelpParseTask(QRunnable):
+    """Turns captured --help output into an options schema on a QThreadPool thread."""
+
+    def __init__(self, gen: int, sid: int, script_path: str, help_text: str, signals: _HelpParseSignals):
+        super().__init__()
+        self.gen = gen
+        self.sid = sid
+        self.script_path = script_path
+        self.help_text = help_text
+        self.signals = signals
+
+    def run(self):
+        schema = ScriptDetailsPanel._parse_help_to_schema(self.help_text)
+        # Augment defaults using AST static analysis (best-effort)
+        try:
+            ast_defaults = ScriptDetailsPanel._extract_ast_defaults(self.script_path)
+            if isinstance(schema, dict) and isinstance(ast_defaults, dict):
+                for opt in schema.get("options", []) or []:
+                    name = opt.get("name")
+                    if name and not opt.get("default") and name in ast_defaults:
+                        opt["default"] = ast_defaults[name]
+        except Exception:
+            pass
+        # Queued to the GUI thread, which stores the schema and rebuilds the form
+        self.signals.done.emit(self.gen, self.sid, schema)
+
+
 class ScriptDetailsPanel(QWidget):
     runRequested = pyqtSignal()
     stopRequested = pyqtSignal()
@@ -687,9 +772,27 @@ class ScriptDetailsPanel(QWidget):
         self._positional_widgets: dict[str, QWidget] = {}
         self._positional_order: list[str] = []
         self._venv_items: list[tuple[int, str, str]] = []  # (id, name, python_path)
+        # Extras of current_sid as last read, kept in step with our own writes
+        self._extras_cache: ScriptExtras = ScriptExtras()
+        # Env/working-dir changes arrive in bursts (a radio toggle fires twice);
+        # they restart this timer so only one help probe is spawned
+        self._probe_timer = QTimer(self)
+        self._probe_timer.setSingleShot(True)
+        self._probe_timer.setInterval(150)
+        self._probe_timer.timeout.connect(self._probe_help_async)
         self._history_models: dict[str, QStringListModel] = {}
         self._history_filters: dict[str, _HistoryEventFilter] = {}
         self._completer_ctrls: dict[str, _CompleterController] = {}
+        self._form_sid: int | None = None  # script the form rows were built for
+        self._probe_gen = 0
+        # One QProcess serves every help probe (replaced only while one is still
+        # running); output stays raw bytes until it ends, then one decode per stream
+        self._probe_buf_out = bytearray()
+        self._probe_buf_err = bytearray()
+        self._probe_run: tuple[int, int, str] | None = None  # (gen, sid, path) of the running probe
+        self._probe_proc = self._new_probe_proc()
+        self._help_parsed = _HelpParseSignals(self)
+        self._help_parsed.done.connect(self._on_help_parsed)
 
         root = QVBoxLayout(self)
 
@@ -769,9 +872,11 @@ class ScriptDetailsPanel(QWidget):
     def set_script(self, sid: int, path: str):
         self.current_sid = sid
         self.current_path = path
+        self._probe_timer.stop()
         extras = get_script_extras(sid)
+        self._extras_cache = extras
         # Select venv
-        self._load_venvs(select_id=extras.get("venv_id"))
+        self._load_venvs(select_id=extras.venv_id)
         self._update_env_path_display()
         try:
             self.script_path_edit.setText(path or "")
@@ -779,17 +884,18 @@ class ScriptDetailsPanel(QWidget):
         except Exception:
             pass
         # Working dir
-        wd = extras.get("working_dir")
+        wd = extras.working_dir
         if wd:
-            self.rb_cwd_custom.setChecked(True)
+            # Text first, so the toggle below already sees the stored value
             self.cwd_edit.setText(wd)
+            self.rb_cwd_custom.setChecked(True)
         else:
             self.rb_cwd_script.setChecked(True)
             self.cwd_edit.clear()
         self._update_wd_enabled()
         # Build UI from cached schema if present, else probe
-        schema_json = extras.get("args_schema")
-        values_json = extras.get("args_values")
+        schema_json = extras.args_schema
+        values_json = extras.args_values
         if schema_json:
             try:
                 schema = json.loads(schema_json)
@@ -807,6 +913,8 @@ class ScriptDetailsPanel(QWidget):
         try:
             self.current_sid = None
             self.current_path = None
+            self._extras_cache = ScriptExtras()
+            self._probe_timer.stop()
             # Reset environment and working dir controls
             try:
                 self.env_combo.setCurrentIndex(0)
@@ -867,7 +975,7 @@ class ScriptDetailsPanel(QWidget):
         self._venv_items = []
         self.env_combo.addItem("System Python")
         select_index = 0
-        for row in list_venvs():
+        for row in cached_list_venvs():
             vid, name, _path, python_path, *_rest = row
             self._venv_items.append((vid, name, python_path))
             self.env_combo.addItem(f"{name}")
@@ -883,8 +991,9 @@ class ScriptDetailsPanel(QWidget):
         idx = self.env_combo.currentIndex()
         venv_id = None if idx == 0 else self._venv_items[idx - 1][0]
         set_script_venv(self.current_sid, venv_id)
+        self._extras_cache = self._extras_cache._replace(venv_id=venv_id)
         # Optionally re-probe on env change
-        self._probe_help_async()
+        self._probe_timer.start()
         self._update_env_path_display()
 
     def _on_workdir_changed(self):
@@ -892,9 +1001,13 @@ class ScriptDetailsPanel(QWidget):
         if self.current_sid is None:
             return
         wd = self.get_working_dir()
+        if wd == self._extras_cache.working_dir:
+            # Toggle pairs and unchanged edits: nothing to store or re-probe
+            return
         set_working_dir(self.current_sid, wd)
+        self._extras_cache = self._extras_cache._replace(working_dir=wd)
         # Re-probe since working dir might affect help
-        self._probe_help_async()
+        self._probe_timer.start()
 
     def _on_browse_wd(self):
         base = str(Path(self.current_path).parent) if self.current_path else str(Path.home())
@@ -934,60 +1047,135 @@ class ScriptDetailsPanel(QWidget):
             self._update_env_path_display()
 
     def _on_probe(self):
-        self._probe_help_async()
+        self._probe_timer.start()
 
     def _clear_form(self):
-        # Remove old widgets
-        while self.form.count():
-            item = self.form.takeAt(0)
-            w = item.widget()
-            if w is not None:
-                w.deleteLater()
+        # Remove old widgets (takeRow, unlike takeAt, leaves no empty rows behind)
+        while self.form.rowCount():
+            taken = self.form.takeRow(0)
+            for item in (taken.labelItem, taken.fieldItem):
+                w = item.widget() if item else None
+                if w is not None:
+                    w.deleteLater()
+        for name in list(self._completer_ctrls):
+            self._drop_history_helpers(name)
         self._option_widgets.clear()
         self._positional_widgets.clear()
         self._positional_order.clear()
         self._history_models.clear()
         self._history_filters.clear()
+        self._form_sid = None
+
+    def _drop_history_helpers(self, name: str):
+        """Delete the completer, model and event filters attached to a removed row."""
+        cc = self._completer_ctrls.pop(name, None)
+        if cc is not None:
+            cc.completer.deleteLater()
+            cc.deleteLater()
+        for obj in (self._history_models.pop(name, None), self._history_filters.pop(name, None)):
+            if obj is not None:
+                obj.deleteLater()
+
+    def _take_form_rows(self) -> dict[tuple[str, str], tuple[QWidget, QWidget]]:
+        """Detach every row without deleting it, keyed by (kind, name) for reuse."""
+        kinds: dict[int, tuple[str, str]] = {}
+        for name, w in self._positional_widgets.items():
+            kinds[id(w)] = ("pos", name)
+        for name, w in self._option_widgets.items():
+            kinds[id(w)] = ("opt" if isinstance(w, QLineEdit) else "flag", name)
+        rows: dict[tuple[str, str], tuple[QWidget, QWidget]] = {}
+        while self.form.rowCount():
+            taken = self.form.takeRow(0)
+            label = taken.labelItem.widget() if taken.labelItem else None
+            w = taken.fieldItem.widget() if taken.fieldItem else None
+            key = kinds.get(id(w)) if w is not None else None
+            if key is None or label is None:
+                for stray in (label, w):
+                    if stray is not None:
+                        stray.deleteLater()
+                continue
+            rows[key] = (label, w)
+        self._option_widgets.clear()
+        self._positional_widgets.clear()
+        self._positional_order.clear()
+        return rows
 
     def _build_form(self, schema: dict, values: dict):
-        self._clear_form()
+        # One layout/paint pass for the whole swap instead of one per removed/added row
+        self.form_host.setUpdatesEnabled(False)
+        try:
+            if self._form_sid is not None and self._form_sid == self.current_sid:
+                # Same script re-probed: rows whose option survived keep their widgets
+                reuse = self._take_form_rows()
+            else:
+                self._clear_form()
+                reuse = {}
+            self._add_form_rows(schema, values, reuse)
+            # Whatever the new schema no longer lists goes away
+            for (_kind, name), (label, w) in reuse.items():
+                label.deleteLater()
+                w.deleteLater()
+                cc = self._completer_ctrls.get(name)
+                if cc is not None and cc.line_edit is w:
+                    self._drop_history_helpers(name)
+            self._form_sid = self.current_sid
+        finally:
+            self.form_host.setUpdatesEnabled(True)
+
+    def _make_history_edit(self, name: str) -> QLineEdit:
+        """QLineEdit with a completer over this option's history."""
+        w = QLineEdit()
+        # 履歴のコンプリート（任意）
+        if self.current_sid is not None:
+            items = list_option_history(self.current_sid, name, limit=20)
+        else:
+            items = []
+        model = QStringListModel(items, self)
+        completer = QCompleter(model, self)
+        # 部分一致に設定（ブラウザ風）
+        try:
+            completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+            completer.setFilterMode(Qt.MatchFlag.MatchContains)
+            completer.setCompletionMode(QCompleter.CompletionMode.PopupCompletion)
+        except Exception:
+            pass
+        w.setCompleter(completer)
+        # Install Shift+Delete handler on popup
+        popup = completer.popup()
+        ef = _HistoryEventFilter(self.current_sid or -1, name, model, self)
+        popup.installEventFilter(ef)
+        self._history_models[name] = model
+        self._history_filters[name] = ef
+        # Show all suggestions when empty
+        cc = _CompleterController(w, completer, self)
+        w.installEventFilter(cc)
+        try:
+            w.textChanged.connect(cc.on_text_changed)
+        except Exception:
+            pass
+        self._completer_ctrls[name] = cc
+        return w
+
+    def _add_form_rows(self, schema: dict, values: dict, reuse: dict[tuple[str, str], tuple[QWidget, QWidget]]):
         # 位置引数（positional arguments）
         positionals = schema.get("positionals", []) if isinstance(schema, dict) else []
         for pos in positionals:
             name = pos.get("name")
             if not name:
                 continue
-            label = QLabel(name)
-            w = QLineEdit()
             val = values.get(name)
-            if isinstance(val, str):
-                w.setText(val)
-            # 履歴のコンプリート（任意）
-            if self.current_sid is not None:
-                items = list_option_history(self.current_sid, name, limit=20)
+            row = reuse.pop(("pos", name), None)
+            if row is not None:
+                label, w = row
+                # Quietly: an emptied field would otherwise pop up its completer
+                w.blockSignals(True)
+                w.setText(val if isinstance(val, str) else "")
+                w.blockSignals(False)
             else:
-                items = []
-            model = QStringListModel(items, self)
-            completer = QCompleter(model, self)
-            try:
-                completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
-                completer.setFilterMode(Qt.MatchFlag.MatchContains)
-                completer.setCompletionMode(QCompleter.CompletionMode.PopupCompletion)
-            except Exception:
-                pass
-            w.setCompleter(completer)
-            popup = completer.popup()
-            ef = _HistoryEventFilter(self.current_sid or -1, name, model, self)
-            popup.installEventFilter(ef)
-            self._history_models[name] = model
-            self._history_filters[name] = ef
-            cc = _CompleterController(w, completer, self)
-            w.installEventFilter(cc)
-            try:
-                w.textChanged.connect(cc.on_text_changed)
-            except Exception:
-                pass
-            self._completer_ctrls[name] = cc
+                label = QLabel(name)
+                w = self._make_history_edit(name)
+                if isinstance(val, str):
+                    w.setText(val)
             self._positional_widgets[name] = w
             self._positional_order.append(name)
             self.form.addRow(label, w)
@@ -998,54 +1186,26 @@ class ScriptDetailsPanel(QWidget):
             if not name:
                 continue
             takes_value = bool(opt.get("takes_value"))
-            label = QLabel(name)
+            val = values.get(name)
+            row = reuse.pop(("opt" if takes_value else "flag", name), None)
             if takes_value:
-                w = QLineEdit()
-                val = values.get(name)
-                if isinstance(val, str):
-                    w.setText(val)
-                # Attach history completer
-                if self.current_sid is not None:
-                    items = list_option_history(self.current_sid, name, limit=20)
+                if row is not None:
+                    label, w = row
+                    w.blockSignals(True)
+                    w.setText(val if isinstance(val, str) else "")
+                    w.blockSignals(False)
                 else:
-                    items = []
-                model = QStringListModel(items, self)
-                completer = QCompleter(model, self)
-                completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
-                # 部分一致に設定（ブラウザ風）
-                try:
-                    completer.setFilterMode(Qt.MatchFlag.MatchContains)
-                except Exception:
-                    pass
-                try:
-                    completer.setCompletionMode(QCompleter.CompletionMode.PopupCompletion)
-                except Exception:
-                    pass
-                w.setCompleter(completer)
-                # Install Shift+Delete handler on popup
-                popup = completer.popup()
-                ef = _HistoryEventFilter(self.current_sid or -1, name, model, self)
-                popup.installEventFilter(ef)
-                self._history_models[name] = model
-                self._history_filters[name] = ef
-                # Show all suggestions when empty
-                cc = _CompleterController(w, completer, self)
-                w.installEventFilter(cc)
-                try:
-                    w.textChanged.connect(cc.on_text_changed)
-                except Exception:
-                    pass
-                self._completer_ctrls[name] = cc
+                    label = QLabel(name)
+                    w = self._make_history_edit(name)
+                    if isinstance(val, str):
+                        w.setText(val)
+                model = self._history_models.get(name)
                 # Seed default into history (if parsed and not present)
                 try:
                     default_val = opt.get("default")
                     if isinstance(default_val, str):
                         default_val = default_val.strip()
-                    if default_val:
-                        try:
-                            pass
-                        except Exception:
-                            pass
+                    if default_val and model is not None:
                         existing = set(model.stringList())
                         if default_val not in existing and self.current_sid is not None:
                             upsert_option_history(self.current_sid, name, default_val)
@@ -1053,19 +1213,18 @@ class ScriptDetailsPanel(QWidget):
                             if len(lst) > 20:
                                 lst = lst[:20]
                             model.setStringList(lst)
-                    else:
-                        try:
-                            pass
-                        except Exception:
-                            pass
                 except Exception:
                     pass
             else:
-                from PyQt6.QtWidgets import QCheckBox
-                w = QCheckBox()
-                val = values.get(name)
-                if isinstance(val, bool):
-                    w.setChecked(val)
+                if row is not None:
+                    label, w = row
+                    w.setChecked(val if isinstance(val, bool) else False)
+                else:
+                    from PyQt6.QtWidgets import QCheckBox
+                    label = QLabel(name)
+                    w = QCheckBox()
+                    if isinstance(val, bool):
+                        w.setChecked(val)
             self._option_widgets[name] = w
             self.form.addRow(label, w)
 
@@ -1073,41 +1232,55 @@ class ScriptDetailsPanel(QWidget):
         if self.current_path is None or self.current_sid is None:
             return
         python = self.get_python_executable() or sys.executable
-        proc = QProcess(self)
+        proc = self._probe_proc
+        if proc.state() != QProcess.ProcessState.NotRunning:
+            # Superseded: cut it loose and let it die in the background instead
+            # of blocking the GUI thread until it has exited
+            for sig in (proc.readyReadStandardOutput, proc.readyReadStandardError, proc.finished):
+                sig.disconnect()
+            proc.finished.connect(proc.deleteLater)
+            proc.kill()
+            proc = self._probe_proc = self._new_probe_proc()
         proc.setProgram(python)
         proc.setArguments([self.current_path, "-h"])
         wd = self.get_working_dir() or str(Path(self.current_path).parent)
         proc.setWorkingDirectory(wd)
-        buf_out = []
-        buf_err = []
-        proc.readyReadStandardOutput.connect(lambda: buf_out.append(bytes(proc.readAllStandardOutput()).decode("utf-8", errors="ignore")))
-        proc.readyReadStandardError.connect(lambda: buf_err.append(bytes(proc.readAllStandardError()).decode("utf-8", errors="ignore")))
-
-        def on_finish(_code, _status):
-            text = "".join(buf_out) + "\n" + "".join(buf_err)
-            schema = self._parse_help_to_schema(text)
-            # Augment defaults using AST static analysis (best-effort)
-            try:
-                ast_defaults = self._extract_ast_defaults(self.current_path)
-                if isinstance(schema, dict) and isinstance(ast_defaults, dict):
-                    for opt in schema.get("options", []) or []:
-                        name = opt.get("name")
-                        if name and not opt.get("default") and name in ast_defaults:
-                            opt["default"] = ast_defaults[name]
-                            pass
-            except Exception as e:
-                pass
-            update_args_schema(self.current_sid, json.dumps(schema, ensure_ascii=False))
-            # Preserve existing values if possible
-            extras = get_script_extras(self.current_sid)
-            values = json.loads(extras["args_values"]) if extras.get("args_values") else {}
-            self._build_form(schema, values)
-            proc.deleteLater()
-
-        proc.finished.connect(on_finish)
+        self._probe_buf_out.clear()
+        self._probe_buf_err.clear()
+        self._probe_gen += 1
+        self._probe_run = (self._probe_gen, self.current_sid, self.current_path)
         proc.start()
 
-    def _extract_ast_defaults(self, script_path: str) -> dict[str, str]:
+    def _new_probe_proc(self) -> QProcess:
+        proc = QProcess(self)
+        proc.readyReadStandardOutput.connect(lambda: self._probe_buf_out.extend(proc.readAllStandardOutput()))
+        proc.readyReadStandardError.connect(lambda: self._probe_buf_err.extend(proc.readAllStandardError()))
+        proc.finished.connect(self._on_probe_finished)
+        return proc
+
+    def _on_probe_finished(self, _code, _status):
+        run, self._probe_run = self._probe_run, None
+        if run is None:
+            return
+        gen, sid, path = run
+        text = self._probe_buf_out.decode("utf-8", errors="ignore") + "\n" + self._probe_buf_err.decode("utf-8", errors="ignore")
+        # Parsing (and the AST pass over the script) runs on a pool thread
+        QThreadPool.globalInstance().start(_HelpParseTask(gen, sid, path, text, self._help_parsed))
+
+    def _on_help_parsed(self, gen: int, sid: int, schema: dict):
+        # Superseded by a newer probe, or the selection moved on meanwhile
+        if gen != self._probe_gen or sid != self.current_sid:
+            return
+        schema_json = json.dumps(schema, ensure_ascii=False)
+        update_args_schema(sid, schema_json)
+        # Preserve existing values if possible (no re-read: the cache follows our writes)
+        self._extras_cache = self._extras_cache._replace(args_schema=schema_json)
+        values_json = self._extras_cache.args_values
+        values = json.loads(values_json) if values_json else {}
+        self._build_form(schema, values)
+
+    @staticmethod
+    def _extract_ast_defaults(script_path: str) -> dict[str, str]:
         """Parse the script via AST and extract add_argument defaults (best-effort).
         Returns mapping from preferred option name (long or first flag) to string default.
         """
@@ -1178,19 +1351,20 @@ class ScriptDetailsPanel(QWidget):
                         result[name] = sval
         return result
 
-    def _parse_help_to_schema(self, help_text: str) -> dict:
+    @staticmethod
+    def _parse_help_to_schema(help_text: str) -> dict:
         # Heuristic parser for argparse-like help with sections
         options: list[dict] = []
         positionals: list[dict] = []
         seen = set()
         section: str | None = None
         for raw in help_text.splitlines():
-            line = raw.rstrip()
-            s = line.strip()
-            if not s:
+            m = _HELP_ENTRY_RE.match(raw)
+            if not m:
                 continue
-            lower = s.lower()
-            if lower.endswith(":"):
+            spec, desc = m.group(1), m.group(2) or ""
+            if not desc and spec.endswith(":"):
+                lower = spec.lower()
                 if "positional" in lower or "位置引数" in lower:
                     section = "positional"
                 elif "optional" in lower or "options" in lower or "オプション" in lower:
@@ -1200,69 +1374,49 @@ class ScriptDetailsPanel(QWidget):
                 continue
             if section == "positional":
                 # Format: NAME  description
-                parts = [p for p in s.split("  ") if p]
-                if not parts:
+                if spec.startswith("-"):
                     continue
-                name = parts[0].strip()
-                if not name or name.startswith("-"):
-                    continue
-                desc = " ".join(parts[1:]) if len(parts) > 1 else ""
-                positionals.append({"name": name, "help": desc})
+                positionals.append({"name": spec, "help": desc})
                 continue
             # Options section or generic fallback for lines starting with '-'
-            if section == "options" or s.startswith("-"):
-                parts = [p for p in s.split("  ") if p]
-                if not parts:
-                    continue
-                opt_part = parts[0]
-                desc = " ".join(parts[1:]) if len(parts) > 1 else ""
-                names = [p.strip() for p in opt_part.split(",")]
-                long_name = None
-                short_name = None
-                takes_value = False
-                metavar = None
-                default_val = None
-                for nm in names:
-                    tokens = nm.split()
-                    if not tokens:
-                        continue
-                    name_tok = tokens[0]
-                    mv = tokens[1] if len(tokens) > 1 else None
-                    if name_tok.startswith("--"):
-                        long_name = name_tok
-                    elif name_tok.startswith("-"):
-                        short_name = name_tok
-                    if mv and mv.upper() == mv:
-                        takes_value = True
-                        metavar = mv
-                    if "=" in name_tok:
-                        takes_value = True
-                if desc:
-                    m = re.search(r"[\[(]\s*default\s*[:=]\s*([^)\]]+)", desc, re.IGNORECASE)
-                    if m:
-                        default_val = m.group(1).strip().strip(',.; ')
-                    else:
-                        m2 = re.search(r"defaults?\s+to\s+([^.;,\]]+)", desc, re.IGNORECASE)
-                        if m2:
-                            default_val = m2.group(1).strip().strip(',.; ')
-                key = long_name or short_name
-                if not key or key in seen:
-                    continue
-                seen.add(key)
-                options.append({
-                    "name": key,
-                    "long": long_name,
-                    "short": short_name,
-                    "takes_value": takes_value,
-                    "metavar": metavar,
-                    "default": default_val,
-                })
+            if not spec.startswith("-"):
+                continue
+            long_name = None
+            short_name = None
+            takes_value = False
+            metavar = None
+            for name_tok, eq, mv in _HELP_OPT_NAME_RE.findall(spec):
+                if name_tok.startswith("--"):
+                    long_name = name_tok
+                else:
+                    short_name = name_tok
+                if eq or (mv and mv.upper() == mv):
+                    takes_value = True
+                    metavar = mv or None
+            key = long_name or short_name
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            default_val = None
+            if desc:
+                dm = _HELP_DEFAULT_RE.search(desc) or _HELP_DEFAULTS_TO_RE.search(desc)
+                if dm:
+                    default_val = dm.group(1).strip().strip(',.; ')
+            options.append({
+                "name": key,
+                "long": long_name,
+                "short": short_name,
+                "takes_value": takes_value,
+                "metavar": metavar,
+                "default": default_val,
+            })
         return {"positionals": positionals, "options": options}
 
     def save_current_values(self):
         if self.current_sid is None:
             return
         values: dict[str, object] = {}
+        history: list[tuple[str, str]] = []
         # Save positional arguments first
         for name in self._positional_order:
             w = self._positional_widgets.get(name)
@@ -1273,21 +1427,27 @@ class ScriptDetailsPanel(QWidget):
                 val = w.text().strip()
                 values[key] = val
                 if val:
-                    # upsert into history and update completer model (MRU)
-                    try:
-                        upsert_option_history(self.current_sid, key, val)
-                    except Exception:
-                        pass
+                    # history rows are written below in one go; update completer model (MRU) now
+                    history.append((key, val))
                     model = self._history_models.get(key)
-                    if model is not None:
+                    # Already the most recent entry: leave the completer's model alone
+                    if model is not None and model.index(0, 0).data() != val:
                         lst = model.stringList()
-                        if val in lst:
-                            lst = [val] + [x for x in lst if x != val]
-                        else:
-                            lst = [val] + lst
-                        if len(lst) > 20:
-                            lst = lst[:20]
+                        try:
+                            lst.remove(val)
+                        except ValueError:
+                            pass
+                        lst.insert(0, val)
+                        del lst[20:]
                         model.setStringList(lst)
             else:
                 values[key] = bool(getattr(w, 'isChecked') and w.isChecked())
-        update_args_values(self.current_sid, json.dumps(values, ensure_ascii=False))
+        values_json = json.dumps(values, ensure_ascii=False)
+        # History and values share one transaction/commit
+        with batch():
+            try:
+                upsert_option_history_bulk(self.current_sid, history)
+            except Exception:
+                pass
+            update_args_values(self.current_sid, values_json)
+        self._extras_cache = self._extras_cache._replace(args_values=values_json)